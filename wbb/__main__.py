@@ -3,6 +3,7 @@ import importlib
 import re
 import signal
 import subprocess
+import sys
 from contextlib import closing, suppress
 
 from pyrogram import filters, idle
@@ -28,6 +29,12 @@ from wbb.utils.functions import extract_text_and_keyb
 
 loop = asyncio.get_event_loop()
 
+# Modules that buffer DB writes in memory: (module, coroutine that drains it)
+SHUTDOWN_FLUSHES = (
+    ("wbb.modules.karma", "flush_karma_history"),
+    ("wbb.modules.media_dedupe", "flush_media_writes"),
+)
+
 HELPABLE = {}
 
 
@@ -120,6 +127,15 @@ async def start_bot():
     # Wait for shutdown event
     await shutdown_event.wait()
 
+    # Write out buffered karma history / media stats so they aren't lost
+    for module_name, flush_name in SHUTDOWN_FLUSHES:
+        module = sys.modules.get(module_name)
+        if module:
+            try:
+                await getattr(module, flush_name)()
+            except Exception as e:
+                log.warning(f"Failed to flush {module_name}: {e}")
+
     # Close aiohttp session before stopping clients
     await aiohttpsession.close()
     log.info("Stopping clients")
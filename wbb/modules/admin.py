@@ -104,6 +104,7 @@ __HELP__ = """/ban - Ban A User
 
 
 admins_in_chat = {}
+ADMIN_STATUSES = (ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR)
 
 
 async def list_admins(chat_id: int):
@@ -117,12 +118,14 @@ async def list_admins(chat_id: int):
     try:
         admins_in_chat[chat_id] = {
             "last_updated_at": time(),
-            "data": [
-                member.user.id
-                async for member in app.get_chat_members(
-                    chat_id, filter=ChatMembersFilter.ADMINISTRATORS
-                )
-            ],
+            "data": frozenset(
+                [
+                    member.user.id
+                    async for member in app.get_chat_members(
+                        chat_id, filter=ChatMembersFilter.ADMINISTRATORS
+                    )
+                ]
+            ),
         }
         return admins_in_chat[chat_id]["data"]
     except Exception as e:
@@ -131,7 +134,7 @@ async def list_admins(chat_id: int):
         # Clear cache entry if it exists
         if chat_id in admins_in_chat:
             del admins_in_chat[chat_id]
-        return []
+        return frozenset()
 
 
 # Admin cache reload
@@ -140,16 +143,21 @@ async def list_admins(chat_id: int):
 @app.on_chat_member_updated()
 async def admin_cache_func(_, cmu: ChatMemberUpdated):
     """Update admin cache when members are promoted/demoted."""
-    if cmu.old_chat_member and cmu.old_chat_member.promoted_by:
+    old, new = cmu.old_chat_member, cmu.new_chat_member
+    if (old and old.status in ADMIN_STATUSES) or (
+        new and new.status in ADMIN_STATUSES
+    ):
         try:
             admins_in_chat[cmu.chat.id] = {
                 "last_updated_at": time(),
-                "data": [
-                    member.user.id
-                    async for member in app.get_chat_members(
-                        cmu.chat.id, filter=ChatMembersFilter.ADMINISTRATORS
-                    )
-                ],
+                "data": frozenset(
+                    [
+                        member.user.id
+                        async for member in app.get_chat_members(
+                            cmu.chat.id, filter=ChatMembersFilter.ADMINISTRATORS
+                        )
+                    ]
+                ),
             }
             log.info(f"Updated admin cache for {cmu.chat.id} [{cmu.chat.title}]")
         except Exception as e:
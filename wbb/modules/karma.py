@@ -1,9 +1,16 @@
 """
 Premium Karma System with Leaderboards, Titles, and Achievements
 """
+import asyncio
+import heapq
+import logging
 import re
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple
 
 from pyrogram import filters
 from pyrogram.types import Message
@@ -13,18 +20,22 @@ from wbb.core.decorators.errors import capture_err
 from wbb.core.decorators.permissions import adminsOnly
 from wbb.core.sections import section
 from wbb.utils.dbfunctions import (
-    alpha_to_int,
     get_karma,
     get_karmas,
+    inc_karma,
     int_to_alpha,
     is_karma_on,
+    karma_chat_aggregate,
     karma_off,
     karma_on,
+    push_karma_history,
     update_karma,
 )
 from wbb.utils.filter_groups import karma_negative_group, karma_positive_group
 from wbb.utils.functions import get_specific_usernames
 
+logger = logging.getLogger(__name__)
+
 __MODULE__ = "Premium Karma"
 __HELP__ = """**Premium Karma System**
 
@@ -85,85 +96,194 @@ TITLES = {
     -999: "⚠️ Controversial"
 }
 
+# Achievements unlocked when a vote lands exactly on a milestone
+ACHIEVEMENTS: Dict[int, str] = {
+    1: "🎖️ First Karma!",
+    100: "💯 Century Club!",
+    500: "🔮 Mystic Achievement!",
+    1000: "🌟 Legendary Status!",
+    -100: "👹 Dark Lord!",
+}
+
+# Ascending title thresholds, precomputed for bisect lookups
+_THRESHOLDS_ASC = sorted(TITLES.keys())
+_TITLES_BY_IDX = [TITLES[t] for t in _THRESHOLDS_ASC]
+
+# Static /karma_title reply, built once at import
+_TITLES_HELP = (
+    "🏅 **KARMA TITLES**\n\n"
+    + "\n".join(
+        f"{TITLES[t]} - Below 0" if t == -999 else f"{TITLES[t]} - {t}+ points"
+        for t in reversed(_THRESHOLDS_ASC)
+    )
+    + "\n\n💡 Keep earning karma to unlock higher titles!"
+)
+
+
+def _a2i(alpha: str) -> int:
+    """Synchronous alpha_to_int for tight loops (avoids a coroutine per key)."""
+    return int(alpha)
+
+
+def _i2a(user_id: int) -> str:
+    """Synchronous int_to_alpha for the vote hot path."""
+    return str(user_id)
+
 
 def get_title(karma: int) -> str:
     """Get title based on karma points"""
-    for threshold in sorted(TITLES.keys(), reverse=True):
-        if karma >= threshold:
-            return TITLES[threshold]
-    return TITLES[-999]
+    i = bisect_right(_THRESHOLDS_ASC, karma) - 1
+    return _TITLES_BY_IDX[i] if i >= 0 else TITLES[-999]
+
+
+def get_next_threshold(karma: int) -> Optional[int]:
+    """Get the lowest title threshold above the given karma, if any"""
+    i = bisect_right(_THRESHOLDS_ASC, karma)
+    return _THRESHOLDS_ASC[i] if i < len(_THRESHOLDS_ASC) else None
+
+
+_MEDALS = ("🥇", "🥈", "🥉")
 
 
 def get_rank_emoji(rank: int) -> str:
     """Get emoji for rank position"""
-    rank_emojis = {
-        1: "🥇",
-        2: "🥈",
-        3: "🥉"
-    }
-    return rank_emojis.get(rank, f"#{rank}")
+    return _MEDALS[rank - 1] if 1 <= rank <= 3 else f"#{rank}"
+
+
+def format_rank(rank: Optional[int]) -> str:
+    """Get the 'Rank: ...' line body for a rank, or an empty string"""
+    return f"Rank: {get_rank_emoji(rank)}" if rank else ""
+
+
+# Cached ranking per chat: ascending (-karma, user_id) keys, user_id -> karma, load time
+RANK_CACHE_TTL = 600  # seconds
+_rank_cache: Dict[int, Tuple[List[Tuple[int, int]], Dict[int, int], float]] = {}
+# Bumped on every karma write, so a load that raced one is not cached
+_rank_gen: Dict[int, int] = {}
+
+
+def _rank_cache_get(chat_id: int):
+    cached = _rank_cache.get(chat_id)
+    if cached is None or time.monotonic() - cached[2] > RANK_CACHE_TTL:
+        return None
+    return cached
+
+
+async def get_chat_ranking(chat_id: int):
+    """Get the chat's cached (keys, scores, loaded_at) ranking, loading it on a miss"""
+    cached = _rank_cache_get(chat_id)
+    if cached is None:
+        started = time.monotonic()
+        gen = _rank_gen.get(chat_id, 0)
+        karma = await get_karmas(chat_id)
+        scores = {
+            _a2i(k): v["karma"]
+            for k, v in karma.items()
+            if isinstance(v, dict) and "karma" in v
+        }
+        keys = sorted((-k, uid) for uid, k in scores.items())
+        # A concurrent load may have finished first and already taken
+        # update_cached_rank patches; keep that one rather than our older read
+        current = _rank_cache.get(chat_id)
+        if current is not None and current[2] >= started:
+            return current
+        cached = (keys, scores, started)
+        # Our read may predate a write made meanwhile; use it this once only
+        if _rank_gen.get(chat_id, 0) == gen:
+            _rank_cache[chat_id] = cached
+    return cached
+
+
+def drop_cached_ranking(chat_id: int):
+    """Forget the chat's ranking after a write update_cached_rank can't patch"""
+    _rank_gen[chat_id] = _rank_gen.get(chat_id, 0) + 1
+    _rank_cache.pop(chat_id, None)
 
 
 async def get_user_rank(chat_id: int, user_id: int) -> Optional[int]:
     """Get user's rank in the chat"""
     try:
-        karma = await get_karmas(chat_id)
-        if not karma:
+        keys, scores, _ = await get_chat_ranking(chat_id)
+        if user_id not in scores:
             return None
-        
-        karma_list = []
-        for i in karma:
-            try:
-                uid = await alpha_to_int(i)
-                user_karma = karma[i]["karma"]
-                karma_list.append((uid, user_karma))
-            except:
-                continue
-        
-        karma_list.sort(key=lambda x: x[1], reverse=True)
-        
-        for idx, (uid, _) in enumerate(karma_list, 1):
-            if uid == user_id:
-                return idx
+        return bisect_left(keys, (-scores[user_id], user_id)) + 1
+    except (ValueError, TypeError) as e:
+        logger.warning("[KARMA] Malformed karma data in chat %s: %s", chat_id, e)
         return None
-    except:
+
+
+def update_cached_rank(chat_id: int, user_id: int, karma: int) -> Optional[int]:
+    """Move a user to their new karma in the cached ranking and return their rank.
+    
+    Returns None when the chat has no live cache, so the caller falls back to
+    get_user_rank. Must be called after every vote, even on a cold cache, so
+    a ranking load that was already reading does not cache a stale snapshot.
+    """
+    _rank_gen[chat_id] = _rank_gen.get(chat_id, 0) + 1
+    cached = _rank_cache_get(chat_id)
+    if cached is None:
         return None
+    keys, scores, _ = cached
+    
+    new_key = (-karma, user_id)
+    old_karma = scores.get(user_id)
+    scores[user_id] = karma
+    if old_karma is None:
+        insort(keys, new_key)
+        return bisect_left(keys, new_key) + 1
+    
+    i = bisect_left(keys, (-old_karma, user_id))
+    # Most votes don't cross a neighbour; then the rank is unchanged
+    if (i == 0 or keys[i - 1] < new_key) and (i == len(keys) - 1 or new_key < keys[i + 1]):
+        keys[i] = new_key
+        return i + 1
+    
+    del keys[i]
+    insort(keys, new_key)
+    return bisect_left(keys, new_key) + 1
 
 
-async def log_karma_change(chat_id: int, user_id: int, change: int, by_user_id: int):
-    """Log karma changes for history tracking"""
-    try:
-        history_key = f"karma_history_{chat_id}"
-        history = await get_karma(chat_id, history_key) or {"history": []}
-        
-        entry = {
-            "user_id": user_id,
-            "change": change,
-            "by_user_id": by_user_id,
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        history_list = history.get("history", [])
-        history_list.insert(0, entry)
-        history_list = history_list[:50]  # Keep last 50 entries
-        
-        await update_karma(chat_id, history_key, {"history": history_list})
-    except:
-        pass
+# Pending history entries per chat (newest first), written out in batches
+HISTORY_LIMIT = 50
+HISTORY_FLUSH_INTERVAL = 10  # seconds
+_history_buf: Dict[int, deque] = {}
+_history_flusher: Optional[asyncio.Task] = None
 
 
-@app.on_message(
-    filters.text
-    & filters.group
-    & filters.incoming
-    & filters.reply
-    & filters.regex(regex_upvote, re.IGNORECASE)
-    & ~filters.via_bot
-    & ~filters.bot,
-    group=karma_positive_group,
-)
-@capture_err
-async def upvote(_, message: Message):
+async def flush_karma_history():
+    """Write buffered history entries for every chat with pending changes"""
+    for chat_id in list(_history_buf):
+        pending = _history_buf.pop(chat_id)
+        try:
+            await push_karma_history(chat_id, list(pending), HISTORY_LIMIT)
+        except Exception as e:
+            logger.warning("[KARMA] Failed to flush history for chat %s: %s", chat_id, e)
+
+
+async def _karma_history_flusher():
+    while True:
+        await asyncio.sleep(HISTORY_FLUSH_INTERVAL)
+        await flush_karma_history()
+
+
+def log_karma_change(chat_id: int, user_id: int, change: int, by_user_id: int):
+    """Buffer a karma change for history tracking"""
+    global _history_flusher
+    
+    entry = {
+        "user_id": user_id,
+        "change": change,
+        "by_user_id": by_user_id,
+        "timestamp": datetime.now().isoformat()
+    }
+    _history_buf.setdefault(chat_id, deque(maxlen=HISTORY_LIMIT)).appendleft(entry)
+    
+    if _history_flusher is None or _history_flusher.done():
+        _history_flusher = asyncio.create_task(_karma_history_flusher())
+
+
+async def _handle_vote(message: Message, delta: int):
+    """Shared implementation of upvote/downvote"""
     if not await is_karma_on(message.chat.id):
         return
     if not message.reply_to_message.from_user:
@@ -178,45 +298,54 @@ async def upvote(_, message: Message):
     voter_id = message.from_user.id
     user_mention = message.reply_to_message.from_user.mention
     
-    # Get current karma
-    current_karma = await get_karma(chat_id, await int_to_alpha(user_id))
-    if current_karma:
-        karma = current_karma["karma"] + 1
-    else:
-        karma = 1
+    # Increment karma and read back the new value in one DB op. The rank is
+    # only read once it has committed, so it always includes this vote.
+    karma = await inc_karma(chat_id, _i2a(user_id), delta)
     
-    # Update karma
-    await update_karma(chat_id, await int_to_alpha(user_id), {"karma": karma})
-    
-    # Log the change
-    await log_karma_change(chat_id, user_id, 1, voter_id)
+    # Log the change (buffered, never blocks the reply)
+    log_karma_change(chat_id, user_id, delta, voter_id)
     
     # Get title and rank
     title = get_title(karma)
-    rank = await get_user_rank(chat_id, user_id)
-    rank_text = f"Rank: {get_rank_emoji(rank)}" if rank and rank <= 10 else f"Rank: #{rank}" if rank else ""
-    
-    # Check for achievements
-    achievements = []
-    if karma == 1:
-        achievements.append("🎖️ First Karma!")
-    elif karma == 100:
-        achievements.append("💯 Century Club!")
-    elif karma == 500:
-        achievements.append("🔮 Mystic Achievement!")
-    elif karma == 1000:
-        achievements.append("🌟 Legendary Status!")
-    
-    response = f"⬆️ **Karma Increased!**\n\n"
-    response += f"👤 {user_mention}\n"
-    response += f"📊 **Points:** {karma} (+1)\n"
-    response += f"🏅 **Title:** {title}\n"
+    rank = update_cached_rank(chat_id, user_id, karma)
+    if rank is None:
+        # The vote is already saved; a failed lookup only drops the rank line
+        try:
+            rank = await get_user_rank(chat_id, user_id)
+        except Exception as e:
+            logger.warning("[KARMA] Failed to get rank in chat %s: %s", chat_id, e)
+    rank_text = format_rank(rank)
+    
+    # Milestones only count when reached in the direction of the vote
+    achievement = ACHIEVEMENTS.get(karma) if karma * delta > 0 else None
+    
+    parts = [
+        "⬆️ **Karma Increased!**\n\n" if delta > 0 else "⬇️ **Karma Decreased!**\n\n",
+        f"👤 {user_mention}\n",
+        f"📊 **Points:** {karma} ({delta:+d})\n",
+        f"🏅 **Title:** {title}\n",
+    ]
     if rank_text:
-        response += f"🎯 {rank_text}\n"
-    if achievements:
-        response += f"\n✨ {' '.join(achievements)}"
+        parts.append(f"🎯 {rank_text}\n")
+    if achievement:
+        parts.append(f"\n✨ {achievement}")
     
-    await message.reply_text(response)
+    await message.reply_text("".join(parts))
+
+
+@app.on_message(
+    filters.text
+    & filters.group
+    & filters.incoming
+    & filters.reply
+    & filters.regex(regex_upvote, re.IGNORECASE)
+    & ~filters.via_bot
+    & ~filters.bot,
+    group=karma_positive_group,
+)
+@capture_err
+async def upvote(_, message: Message):
+    return await _handle_vote(message, +1)
 
 
 @app.on_message(
@@ -231,53 +360,7 @@ async def upvote(_, message: Message):
 )
 @capture_err
 async def downvote(_, message: Message):
-    if not await is_karma_on(message.chat.id):
-        return
-    if not message.reply_to_message.from_user:
-        return
-    if not message.from_user:
-        return
-    if message.reply_to_message.from_user.id == message.from_user.id:
-        return await message.reply_text("❌ You cannot vote for yourself!")
-    
-    chat_id = message.chat.id
-    user_id = message.reply_to_message.from_user.id
-    voter_id = message.from_user.id
-    user_mention = message.reply_to_message.from_user.mention
-    
-    # Get current karma
-    current_karma = await get_karma(chat_id, await int_to_alpha(user_id))
-    if current_karma:
-        karma = current_karma["karma"] - 1
-    else:
-        karma = -1
-    
-    # Update karma
-    await update_karma(chat_id, await int_to_alpha(user_id), {"karma": karma})
-    
-    # Log the change
-    await log_karma_change(chat_id, user_id, -1, voter_id)
-    
-    # Get title and rank
-    title = get_title(karma)
-    rank = await get_user_rank(chat_id, user_id)
-    rank_text = f"Rank: {get_rank_emoji(rank)}" if rank and rank <= 10 else f"Rank: #{rank}" if rank else ""
-    
-    # Check for negative achievements
-    achievements = []
-    if karma == -100:
-        achievements.append("👹 Dark Lord!")
-    
-    response = f"⬇️ **Karma Decreased!**\n\n"
-    response += f"👤 {user_mention}\n"
-    response += f"📊 **Points:** {karma} (-1)\n"
-    response += f"🏅 **Title:** {title}\n"
-    if rank_text:
-        response += f"🎯 {rank_text}\n"
-    if achievements:
-        response += f"\n✨ {' '.join(achievements)}"
-    
-    await message.reply_text(response)
+    return await _handle_vote(message, -1)
 
 
 @app.on_message(filters.command("karma") & filters.group)
@@ -293,33 +376,25 @@ async def command_karma(_, message: Message):
             if not karma:
                 return await m.edit("📭 No karma data available for this chat.")
             
-            karma_dicc = {}
-            for i in karma:
-                if i.startswith("karma_history"):
-                    continue
-                try:
-                    user_id = await alpha_to_int(i)
-                    user_karma = karma[i]["karma"]
-                    karma_dicc[str(user_id)] = user_karma
-                except Exception as e:
-                    print(f"[KARMA] Error processing user {i}: {e}")
-                    continue
+            try:
+                rows = [
+                    (_a2i(k), v["karma"])
+                    for k, v in karma.items()
+                    if isinstance(v, dict) and "karma" in v
+                ]
+            except (ValueError, TypeError) as e:
+                logger.warning("[KARMA] Malformed karma data in chat %s: %s", chat_id, e)
+                return await m.edit("❌ Karma data for this chat is corrupted.")
             
-            if not karma_dicc:
+            if not rows:
                 return await m.edit("📭 No karma data available for this chat.")
             
-            karma_sorted = sorted(
-                karma_dicc.items(),
-                key=lambda item: item[1],
-                reverse=True
-            )
+            karma_sorted = heapq.nlargest(15, rows, key=itemgetter(1))
             
-            leaderboard = "🏆 **KARMA LEADERBOARD** 🏆\n\n"
+            parts = ["🏆 **KARMA LEADERBOARD** 🏆\n\n"]
             
             displayed = 0
-            for idx, (user_id_str, karma_count) in enumerate(karma_sorted[:15], 1):
-                user_id_int = int(user_id_str)
-                
+            for idx, (user_id_int, karma_count) in enumerate(karma_sorted, 1):
                 # Try to get user info directly from Telegram
                 try:
                     user = await app.get_users(user_id_int)
@@ -329,29 +404,31 @@ async def command_karma(_, message: Message):
                         display_name = user.first_name
                     else:
                         display_name = f"User {user_id_int}"
-                except:
+                except Exception:
                     display_name = f"User {user_id_int}"
                 
                 title = get_title(karma_count)
                 rank_emoji = get_rank_emoji(idx)
                 
-                leaderboard += f"{rank_emoji} **{display_name}**\n"
-                leaderboard += f"   ├ 📊 Points: **{karma_count}**\n"
-                leaderboard += f"   └ 🏅 {title}\n\n"
+                parts.append(
+                    f"{rank_emoji} **{display_name}**\n"
+                    f"   ├ 📊 Points: **{karma_count}**\n"
+                    f"   └ 🏅 {title}\n\n"
+                )
                 displayed += 1
             
             if displayed == 0:
                 return await m.edit("📭 No valid users found with karma.")
             
-            leaderboard += f"💬 Chat: **{message.chat.title}**\n"
-            leaderboard += f"👥 Total Users: **{len(karma_dicc)}**"
+            parts.append(
+                f"💬 Chat: **{message.chat.title}**\n"
+                f"👥 Total Users: **{len(rows)}**"
+            )
             
-            await m.edit(leaderboard)
+            await m.edit("".join(parts))
             
         except Exception as e:
-            print(f"[KARMA] Leaderboard error: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("[KARMA] Leaderboard error: %s", e)
             await m.edit(f"❌ Error: {str(e)}")
     
     else:
@@ -372,7 +449,7 @@ async def command_karma(_, message: Message):
             response += f"📈 **Points:** {karma_value}\n"
             response += f"🏅 **Title:** {title}\n"
             if rank:
-                response += f"🎯 **Rank:** {get_rank_emoji(rank) if rank <= 3 else f'#{rank}'}"
+                response += f"🎯 **Rank:** {get_rank_emoji(rank)}"
             
             await message.reply_text(response)
         except Exception as e:
@@ -393,23 +470,24 @@ async def my_karma(_, message: Message):
         rank = await get_user_rank(chat_id, user_id)
         
         # Calculate next title threshold
-        next_threshold = None
-        for threshold in sorted(TITLES.keys(), reverse=True):
-            if karma_value < threshold:
-                next_threshold = threshold
+        next_threshold = get_next_threshold(karma_value)
         
-        response = f"📊 **Your Karma Profile**\n\n"
-        response += f"👤 {user_mention}\n"
-        response += f"📈 **Points:** {karma_value}\n"
-        response += f"🏅 **Title:** {title}\n"
+        parts = [
+            "📊 **Your Karma Profile**\n\n",
+            f"👤 {user_mention}\n",
+            f"📈 **Points:** {karma_value}\n",
+            f"🏅 **Title:** {title}\n",
+        ]
         if rank:
-            response += f"🎯 **Rank:** {get_rank_emoji(rank) if rank <= 3 else f'#{rank}'}\n"
+            parts.append(f"🎯 **Rank:** {get_rank_emoji(rank)}\n")
         if next_threshold:
             points_needed = next_threshold - karma_value
-            response += f"\n🎯 **Next Title:** {TITLES[next_threshold]}\n"
-            response += f"📍 **Points Needed:** {points_needed}"
+            parts.append(
+                f"\n🎯 **Next Title:** {TITLES[next_threshold]}\n"
+                f"📍 **Points Needed:** {points_needed}"
+            )
         
-        await message.reply_text(response)
+        await message.reply_text("".join(parts))
     except Exception as e:
         await message.reply_text(f"❌ Error: {str(e)}")
 
@@ -421,46 +499,32 @@ async def karma_stats(_, message: Message):
     m = await message.reply_text("📊 Calculating statistics...")
     
     try:
-        karma = await get_karmas(chat_id)
-        if not karma:
+        agg = await karma_chat_aggregate(chat_id)
+        total_users = agg["total_users"]
+        if not total_users:
             return await m.edit("📭 No karma data available.")
         
-        total_users = 0
-        total_karma = 0
-        positive_karma = 0
-        negative_karma = 0
-        max_karma = float('-inf')
-        min_karma = float('inf')
-        
-        for i in karma:
-            if i.startswith("karma_history"):
-                continue
-            try:
-                user_karma = karma[i]["karma"]
-                total_users += 1
-                total_karma += user_karma
-                if user_karma > 0:
-                    positive_karma += 1
-                elif user_karma < 0:
-                    negative_karma += 1
-                max_karma = max(max_karma, user_karma)
-                min_karma = min(min_karma, user_karma)
-            except:
-                continue
+        total_karma = agg["total_karma"]
+        positive_karma = agg["positive"]
+        negative_karma = agg["negative"]
+        max_karma = agg["max"]
+        min_karma = agg["min"]
         
         avg_karma = total_karma / total_users if total_users > 0 else 0
         neutral_karma = total_users - positive_karma - negative_karma
         
-        stats = f"📊 **KARMA STATISTICS**\n\n"
-        stats += f"💬 **Chat:** {message.chat.title}\n\n"
-        stats += f"👥 **Total Users:** {total_users}\n"
-        stats += f"📈 **Total Karma:** {total_karma}\n"
-        stats += f"📊 **Average Karma:** {avg_karma:.1f}\n\n"
-        stats += f"✅ **Positive Users:** {positive_karma}\n"
-        stats += f"⚫ **Neutral Users:** {neutral_karma}\n"
-        stats += f"❌ **Negative Users:** {negative_karma}\n\n"
-        stats += f"🔝 **Highest Karma:** {max_karma}\n"
-        stats += f"🔻 **Lowest Karma:** {min_karma}"
+        stats = (
+            f"📊 **KARMA STATISTICS**\n\n"
+            f"💬 **Chat:** {message.chat.title}\n\n"
+            f"👥 **Total Users:** {total_users}\n"
+            f"📈 **Total Karma:** {total_karma}\n"
+            f"📊 **Average Karma:** {avg_karma:.1f}\n\n"
+            f"✅ **Positive Users:** {positive_karma}\n"
+            f"⚫ **Neutral Users:** {neutral_karma}\n"
+            f"❌ **Negative Users:** {negative_karma}\n\n"
+            f"🔝 **Highest Karma:** {max_karma}\n"
+            f"🔻 **Lowest Karma:** {min_karma}"
+        )
         
         await m.edit(stats)
     except Exception as e:
@@ -475,21 +539,19 @@ async def karma_rank(_, message: Message):
     user_mention = message.from_user.mention
     
     try:
-        rank = await get_user_rank(chat_id, user_id)
-        karma_data = await get_karma(chat_id, await int_to_alpha(user_id))
-        karma_value = karma_data["karma"] if karma_data else 0
-        
-        if not rank:
+        # Rank, karma and user count all come from one ranking snapshot
+        keys, scores, _ = await get_chat_ranking(chat_id)
+        if user_id not in scores:
             return await message.reply_text("❌ You don't have any karma yet!")
         
-        # Get total users
-        karma = await get_karmas(chat_id)
-        total_users = sum(1 for k in karma if not k.startswith("karma_history"))
+        karma_value = scores[user_id]
+        rank = bisect_left(keys, (-karma_value, user_id)) + 1
+        total_users = len(keys)
         
         response = f"🎯 **Your Ranking**\n\n"
         response += f"👤 {user_mention}\n"
         response += f"📊 **Karma:** {karma_value}\n"
-        response += f"🏆 **Rank:** {get_rank_emoji(rank) if rank <= 3 else f'#{rank}'}\n"
+        response += f"🏆 **Rank:** {get_rank_emoji(rank)}\n"
         response += f"👥 **Out of:** {total_users} users\n"
         response += f"📈 **Top {(rank/total_users*100):.1f}%**"
         
@@ -501,17 +563,7 @@ async def karma_rank(_, message: Message):
 @app.on_message(filters.command("karma_title") & filters.group)
 @capture_err
 async def karma_title(_, message: Message):
-    titles_text = "🏅 **KARMA TITLES**\n\n"
-    
-    for threshold in sorted(TITLES.keys(), reverse=True):
-        if threshold == -999:
-            titles_text += f"{TITLES[threshold]} - Below 0\n"
-        else:
-            titles_text += f"{TITLES[threshold]} - {threshold}+ points\n"
-    
-    titles_text += "\n💡 Keep earning karma to unlock higher titles!"
-    
-    await message.reply_text(titles_text)
+    await message.reply_text(_TITLES_HELP)
 
 
 @app.on_message(filters.command(["karma_reset"]) & filters.group)
@@ -529,6 +581,7 @@ async def karma_reset(_, message: Message):
     user_mention = message.reply_to_message.from_user.mention
     
     await update_karma(chat_id, await int_to_alpha(user_id), {"karma": 0})
+    drop_cached_ranking(chat_id)
     await message.reply_text(f"✅ Reset karma for {user_mention} to 0.")
 
 
@@ -555,6 +608,7 @@ async def karma_set(_, message: Message):
     user_mention = message.reply_to_message.from_user.mention
     
     await update_karma(chat_id, await int_to_alpha(user_id), {"karma": amount})
+    drop_cached_ranking(chat_id)
     title = get_title(amount)
     
     await message.reply_text(
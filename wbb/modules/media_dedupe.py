@@ -19,19 +19,23 @@ Commands:
 """
 
 import asyncio
-import hashlib
+import logging
 import time
+from bisect import bisect_right
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 
 from pyrogram import filters
 from pyrogram.types import Message
 from pyrogram.enums import ChatMemberStatus
+from pyrogram.errors import FloodWait
 from wbb import app, SUDOERS, SUDOERS_SET
+from wbb.modules.admin import list_admins
 
 from wbb.utils.dbfunctions import (
-    is_dedupe_enabled, set_dedupe_enabled, check_duplicate_media, save_media_hash,
-    increment_user_media, get_user_media_stats, get_media_leaderboard,
+    get_dedupe_enabled_chats, set_dedupe_enabled, check_duplicate_media, save_media_batch,
+    get_media_hashes, prune_media_hashes,
+    get_user_media_stats, get_media_leaderboard,
     get_inactive_media_users, get_low_media_users, get_chat_media_stats
 )
 
@@ -69,10 +73,15 @@ Automatically detect and remove duplicate media, track user contributions, and m
 **Notes:**
 - Only tracks media sent after bot is added
 - Counts photos and videos only (not documents)
-- Duplicate detection uses file hash matching
+- Duplicate detection uses Telegram's unique file ID
+- Duplicates are matched against the last 90 days of media
 - Inactive kick requires admin privileges
 """
 
+# ==================== LOGGING ====================
+
+logger = logging.getLogger(__name__)
+
 # ==================== CONSTANTS ====================
 
 # Time parsing
@@ -85,20 +94,117 @@ TIME_UNITS = {
     'M': 2592000,  # 30 days
 }
 
-# Leaderboard emojis
-RANK_EMOJIS = {
-    1: "🥇",
-    2: "🥈", 
-    3: "🥉",
-    4: "4️⃣",
-    5: "5️⃣",
-    6: "6️⃣",
-    7: "7️⃣",
-    8: "8️⃣",
-    9: "9️⃣",
-    10: "🔟"
+# format_time_ago buckets: bisect diff into _AGO_BOUNDS to pick (divisor, suffix)
+_AGO_BOUNDS = (60, 3600, 86400, 604800, 2592000)
+_AGO_UNITS = (
+    (1, None),
+    (60, "m ago"),
+    (3600, "h ago"),
+    (86400, "d ago"),
+    (604800, "w ago"),
+    (2592000, "mo ago"),
+)
+
+# Concurrent ban/unban calls during bulk kicks
+KICK_CONCURRENCY = 5
+# Ban/unban API calls per second across all bulk kicks
+KICK_RATE = 15
+
+# Duplicate-removal DM, per media type
+_DUP_NOTIFY = {
+    media_type: (
+        f"⚠️ Your {media_type} was removed from **{{title}}** "
+        "because it was already posted by another user."
+    )
+    for media_type in ("photo", "video")
 }
 
+# Leaderboard emojis, indexed by rank (index 0 unused)
+RANK_EMOJIS = ("", "🥇", "🥈", "🥉", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", "🔟")
+
+# Chats with dedupe enabled, loaded from the DB once and kept in sync by
+# set_dedupe (settings change far less often than media arrives)
+_dedupe_chats: Optional[set] = None
+
+# Media writes are buffered and flushed in one transaction per batch
+MEDIA_FLUSH_INTERVAL = 0.5  # seconds
+MEDIA_FLUSH_MAX = 100  # pending hashes that trigger an early flush
+# Dedupe only looks back this far; older hashes are pruned by the flusher
+MEDIA_HASH_RETENTION = 90 * 86400  # seconds
+MEDIA_PRUNE_INTERVAL = 3600  # seconds
+# (chat_id, file_hash) -> (user_id, message_id, timestamp); file_hash is the
+# media's file_unique_id, which is already a stable short per-file key
+_pending_hashes: Dict[Tuple[int, str], Tuple[int, int, int]] = {}
+_flushing_hashes: Dict[Tuple[int, str], Tuple[int, int, int]] = {}
+# (chat_id, user_id) -> [photos, videos, last_media]
+_pending_counts: Dict[Tuple[int, int], List[int]] = {}
+_media_flusher: Optional[asyncio.Task] = None
+# Serialises the background flusher and the shutdown flush
+_media_flush_lock = asyncio.Lock()
+_media_flush_wakeup: Optional[asyncio.Event] = None
+
+# Resolved mentions: user_id -> (mention, expires_at monotonic)
+MENTION_CACHE_TTL = 600  # seconds
+_mention_cache: Dict[int, Tuple[str, float]] = {}
+
+# Albums whose first item was new: media_group_id -> expiry (monotonic)
+ALBUM_CACHE_TTL = 60  # seconds
+ALBUM_CACHE_PRUNE = 1000  # entries before expired ones are swept
+_new_albums: Dict[str, float] = {}
+
+# ==================== BLOOM PREFILTER ====================
+
+class MediaBloom:
+    """Fixed-size in-memory Bloom filter over a chat's media keys.
+    
+    A miss means the key was never stored, so the DB lookup can be skipped.
+    """
+    __slots__ = ("bits", "ready")
+    
+    SIZE = 1 << 19  # bits, 64 KiB per chat (~0.7% false positives at 50k keys)
+    HASHES = 7
+    
+    def __init__(self):
+        self.bits = bytearray(self.SIZE >> 3)
+        self.ready = False
+    
+    def _positions(self, key: str):
+        h = hash(key)
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return ((h1 + i * h2) % self.SIZE for i in range(self.HASHES))
+    
+    def add(self, key: str):
+        for p in self._positions(key):
+            self.bits[p >> 3] |= 1 << (p & 7)
+    
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+_media_blooms: Dict[int, MediaBloom] = {}
+
+async def _load_media_bloom(chat_id: int, bloom: MediaBloom):
+    try:
+        for file_hash in await get_media_hashes(chat_id):
+            bloom.add(file_hash)
+        bloom.ready = True
+    except Exception as e:
+        _media_blooms.pop(chat_id, None)
+        logger.warning("[DEDUPE] Failed to load media bloom for chat %s: %s", chat_id, e)
+
+def get_media_bloom(chat_id: int) -> Optional[MediaBloom]:
+    """Get the chat's loaded Bloom filter, starting a background load on first touch."""
+    bloom = _media_blooms.get(chat_id)
+    if bloom is None:
+        # New writes are added while it loads; lookups use the DB until ready
+        bloom = _media_blooms[chat_id] = MediaBloom()
+        # Buffered hashes may reach the DB only after the load has read it
+        for buffered in (_pending_hashes, _flushing_hashes):
+            for buffered_chat, file_hash in buffered:
+                if buffered_chat == chat_id:
+                    bloom.add(file_hash)
+        asyncio.create_task(_load_media_bloom(chat_id, bloom))
+    return bloom if bloom.ready else None
+
 # ==================== HELPER FUNCTIONS ====================
 
 def parse_time(time_str: str) -> Optional[int]:
@@ -106,118 +212,324 @@ def parse_time(time_str: str) -> Optional[int]:
     if not time_str:
         return None
     
-    time_str = time_str.lower().strip()
-    
-    # Extract number and unit
-    import re
-    match = re.match(r'^(\d+)([smhdwM])$', time_str)
-    if not match:
+    # Split number and one-char unit ('M' is months, 'm' minutes; other
+    # units are case-insensitive)
+    time_str = time_str.strip()
+    amount, unit = time_str[:-1], time_str[-1:]
+    seconds = TIME_UNITS.get(unit) or TIME_UNITS.get(unit.lower())
+    if not seconds or not amount.isdecimal():
         return None
     
-    amount, unit = match.groups()
-    amount = int(amount)
-    
-    return amount * TIME_UNITS.get(unit, 0)
+    return int(amount) * seconds
 
 def format_time_ago(timestamp: int) -> str:
     """Format timestamp as 'X days ago'."""
-    now = int(time.time())
-    diff = now - timestamp
+    diff = int(time.time()) - timestamp
     
-    if diff < 60:
+    divisor, suffix = _AGO_UNITS[bisect_right(_AGO_BOUNDS, diff)]
+    if suffix is None:
         return "just now"
-    elif diff < 3600:
-        mins = diff // 60
-        return f"{mins}m ago"
-    elif diff < 86400:
-        hours = diff // 3600
-        return f"{hours}h ago"
-    elif diff < 604800:
-        days = diff // 86400
-        return f"{days}d ago"
-    elif diff < 2592000:
-        weeks = diff // 604800
-        return f"{weeks}w ago"
+    return f"{diff // divisor}{suffix}"
+
+async def _dedupe_state() -> set:
+    """Get the set of chats with dedupe on, loading every setting once."""
+    global _dedupe_chats
+    if _dedupe_chats is None:
+        chats = set(await get_dedupe_enabled_chats())
+        # Another caller may have finished loading (and been updated) meanwhile
+        if _dedupe_chats is None:
+            _dedupe_chats = chats
+    return _dedupe_chats
+
+async def dedupe_enabled(chat_id: int) -> bool:
+    """Check the in-memory dedupe settings; only the first call reads the DB."""
+    return chat_id in await _dedupe_state()
+
+async def set_dedupe(chat_id: int, enabled: bool):
+    """Write-through set_dedupe_enabled that keeps the in-memory settings current."""
+    chats = await _dedupe_state()
+    await set_dedupe_enabled(chat_id, enabled)
+    if enabled:
+        chats.add(chat_id)
     else:
-        months = diff // 2592000
-        return f"{months}mo ago"
+        chats.discard(chat_id)
 
-def get_media_hash(file_unique_id: str) -> str:
-    """Generate hash from file unique ID."""
-    return hashlib.sha256(file_unique_id.encode()).hexdigest()
+def pending_media_hash(chat_id: int, file_hash: str) -> Optional[dict]:
+    """Look up a hash that is buffered but not yet written to the DB."""
+    key = (chat_id, file_hash)
+    entry = _pending_hashes.get(key) or _flushing_hashes.get(key)
+    if entry:
+        return {"user_id": entry[0], "message_id": entry[1]}
+    return None
+
+async def flush_media_writes():
+    """Write all buffered media hashes and counts in a single transaction.
+    
+    A failed batch is merged back into the buffers and retried next flush.
+    """
+    global _pending_hashes, _flushing_hashes, _pending_counts
+    
+    async with _media_flush_lock:
+        if not _pending_hashes and not _pending_counts:
+            return
+        
+        # Hashes stay visible to pending_media_hash until the write lands
+        _flushing_hashes, _pending_hashes = _pending_hashes, {}
+        counts, _pending_counts = _pending_counts, {}
+        
+        try:
+            await save_media_batch(
+                [(c, h, u, m, ts) for (c, h), (u, m, ts) in _flushing_hashes.items()],
+                [(c, u, p, v, last) for (c, u), (p, v, last) in counts.items()]
+            )
+        except Exception as e:
+            logger.warning("[DEDUPE] Failed to flush %d media writes: %s", len(_flushing_hashes), e)
+            # The batch rolled back; the earlier entry is the original post
+            _pending_hashes.update(_flushing_hashes)
+            for key, (photos, videos, last) in counts.items():
+                newer = _pending_counts.get(key)
+                if newer is None:
+                    _pending_counts[key] = [photos, videos, last]
+                else:
+                    newer[0] += photos
+                    newer[1] += videos
+                    newer[2] = max(newer[2], last)
+        finally:
+            _flushing_hashes = {}
+
+async def _media_flush_worker():
+    next_prune = time.monotonic()
+    while True:
+        try:
+            await asyncio.wait_for(_media_flush_wakeup.wait(), MEDIA_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _media_flush_wakeup.clear()
+        await flush_media_writes()
+        
+        # Expire old hashes so the table and its index stay bounded
+        if time.monotonic() >= next_prune:
+            next_prune = time.monotonic() + MEDIA_PRUNE_INTERVAL
+            try:
+                removed = await prune_media_hashes(MEDIA_HASH_RETENTION)
+                if removed:
+                    logger.info("[DEDUPE] Pruned %d media hashes past retention", removed)
+            except Exception as e:
+                logger.warning("[DEDUPE] Failed to prune media hashes: %s", e)
+
+def queue_media_write(chat_id: int, file_hash: str, user_id: int, message_id: int, media_type: str):
+    """Buffer a media hash and count increment for the next batch flush."""
+    global _media_flusher, _media_flush_wakeup
+    
+    now = int(time.time())
+    _pending_hashes.setdefault((chat_id, file_hash), (user_id, message_id, now))
+    bloom = _media_blooms.get(chat_id)
+    if bloom is not None:
+        bloom.add(file_hash)
+    
+    counts = _pending_counts.setdefault((chat_id, user_id), [0, 0, now])
+    counts[0 if media_type == "photo" else 1] += 1
+    counts[2] = now
+    
+    if _media_flusher is None or _media_flusher.done():
+        _media_flush_wakeup = asyncio.Event()
+        _media_flusher = asyncio.create_task(_media_flush_worker())
+    if len(_pending_hashes) >= MEDIA_FLUSH_MAX:
+        _media_flush_wakeup.set()
+
+# Strong references to fire-and-forget tasks so they aren't collected mid-run
+_background_tasks = set()
+
+def run_in_background(coro):
+    """Schedule a coroutine without awaiting it."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def notify_duplicate(user_id: int, text: str):
+    """DM a user that their duplicate was removed."""
+    try:
+        await app.send_message(user_id, text)
+    except Exception:
+        pass  # User has blocked bot
+
+async def find_duplicate(chat_id: int, file_hash: str, media_group_id: Optional[str]) -> Optional[dict]:
+    """Find an earlier post of this media, or None if it's new."""
+    now = time.monotonic()
+    
+    # The rest of an album whose first item was new is treated as new too
+    if media_group_id and _new_albums.get(media_group_id, 0) > now:
+        return None
+    
+    # A Bloom miss means it's new, skip the DB
+    bloom = get_media_bloom(chat_id)
+    duplicate = pending_media_hash(chat_id, file_hash)
+    if not duplicate and (bloom is None or file_hash in bloom):
+        duplicate = await check_duplicate_media(chat_id, file_hash)
+    
+    if not duplicate and media_group_id:
+        if len(_new_albums) >= ALBUM_CACHE_PRUNE:
+            for album_id in [a for a, exp in _new_albums.items() if exp <= now]:
+                del _new_albums[album_id]
+        _new_albums[media_group_id] = now + ALBUM_CACHE_TTL
+    return duplicate
 
 async def is_admin_or_sudo(chat_id: int, user_id: int) -> bool:
-    """Check if user is admin or sudo."""
+    """Check if user is admin or sudo (cached admin set, refreshed on admin changes)."""
     if user_id in SUDOERS_SET:
         return True
+    return user_id in await list_admins(chat_id)
+
+async def get_mentions(user_ids: List[int]) -> Dict[int, str]:
+    """Resolve user mentions, fetching only uncached users in one get_users call."""
+    now = time.monotonic()
+    mentions = {}
+    missing = []
+    for user_id in user_ids:
+        cached = _mention_cache.get(user_id)
+        if cached and cached[1] > now:
+            mentions[user_id] = cached[0]
+        else:
+            missing.append(user_id)
     
+    if not missing:
+        return mentions
     try:
-        member = await app.get_chat_member(chat_id, user_id)
-        return member.status in [ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR]
-    except:
-        return False
+        users = await app.get_users(missing)
+    except Exception:
+        # One unresolvable ID fails the whole batch, retry individually
+        results = await asyncio.gather(
+            *(app.get_users(u) for u in missing), return_exceptions=True
+        )
+        users = [u for u in results if not isinstance(u, Exception)]
+    
+    expires = now + MENTION_CACHE_TTL
+    for user in users:
+        mentions[user.id] = user.mention
+        _mention_cache[user.id] = (user.mention, expires)
+    return mentions
+
+class TokenBucket:
+    """Async token bucket allowing `rate` acquisitions per second (bursting to `rate`)."""
+    
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+    
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+_kick_limiter = TokenBucket(KICK_RATE)
+
+async def _rate_limited(call, *args):
+    """Run a Telegram API call under the kick rate limit, waiting out FloodWait."""
+    while True:
+        await _kick_limiter.acquire()
+        try:
+            return await call(*args)
+        except FloodWait as e:
+            await asyncio.sleep(int(e.value))
+
+async def kick_users(chat_id: int, user_ids: List[int], progress: Message, tag: str) -> Tuple[int, int]:
+    """Kick (ban + unban) users with bounded concurrency, skipping admins/sudo.
+    
+    Returns (kicked, failed).
+    """
+    total = len(user_ids)
+    kicked = 0
+    failed = 0
+    
+    # One cached admin set instead of a get_chat_member call per user
+    admin_ids = await list_admins(chat_id)
+    if not admin_ids:
+        # Every group has at least one admin; an empty set means the lookup
+        # failed, and kicking blind could remove admins
+        logger.warning("[%s] Admin list unavailable for chat %s, not kicking", tag, chat_id)
+        return 0, total
+    
+    async def kick_one(user_id: int):
+        nonlocal kicked
+        # Don't kick admins or sudo users
+        if user_id in admin_ids or user_id in SUDOERS_SET:
+            return
+        
+        await _rate_limited(app.ban_chat_member, chat_id, user_id)
+        await _rate_limited(app.unban_chat_member, chat_id, user_id)
+        kicked += 1
+        
+        # Update progress every 10 kicks
+        if kicked % 10 == 0:
+            try:
+                await progress.edit_text(f"⏳ Progress: {kicked}/{total} removed...")
+            except Exception:
+                pass
+    
+    # A fixed pool of workers pulls IDs from one shared iterator, so memory
+    # stays flat however many users match (no task or result per user)
+    pending = iter(user_ids)
+    
+    async def worker():
+        nonlocal failed
+        for user_id in pending:
+            try:
+                await kick_one(user_id)
+            except Exception as e:
+                failed += 1
+                logger.warning("[%s] Failed to kick user %s: %s", tag, user_id, e)
+    
+    await asyncio.gather(*(worker() for _ in range(KICK_CONCURRENCY)))
+    return kicked, failed
 
 # ==================== MESSAGE HANDLERS ====================
 
 @app.on_message(filters.group & (filters.photo | filters.video))
 async def handle_media(_, message: Message):
     """Handle incoming media for deduplication and tracking."""
-    chat_id = message.chat.id
-    user_id = message.from_user.id if message.from_user else 0
-    
-    if user_id == 0:  # Anonymous admin or channel
+    # Anonymous admin or channel: nothing to attribute, bail before any work
+    if not message.from_user:
         return
     
-    # Determine media type and get file
-    media_type = None
-    file_unique_id = None
-    
-    if message.photo:
-        media_type = "photo"
-        file_unique_id = message.photo.file_unique_id
-    elif message.video:
-        media_type = "video"
-        file_unique_id = message.video.file_unique_id
+    chat_id = message.chat.id
+    user_id = message.from_user.id
     
-    if not file_unique_id:
+    # Determine media type and get file (the filter guarantees one of them)
+    photo = message.photo
+    media = photo or message.video
+    if media is None or not media.file_unique_id:
         return
-    
-    # Generate hash
-    file_hash = get_media_hash(file_unique_id)
+    media_type = "photo" if photo else "video"
+    file_unique_id = media.file_unique_id
     
     # Check if deduplication is enabled
-    if await is_dedupe_enabled(chat_id):
+    if await dedupe_enabled(chat_id):
         # Check for duplicate
-        duplicate = await check_duplicate_media(chat_id, file_hash)
+        duplicate = await find_duplicate(chat_id, file_unique_id, message.media_group_id)
         
         if duplicate:
             try:
                 # Delete duplicate
                 await message.delete()
                 
-                # Get original poster
-                original_user = duplicate.get("user_id")
+                # Notify user (silently) without holding up the handler
+                run_in_background(notify_duplicate(
+                    user_id, _DUP_NOTIFY[media_type].format(title=message.chat.title)
+                ))
                 
-                # Notify user (silently)
-                try:
-                    await app.send_message(
-                        user_id,
-                        f"⚠️ Your {media_type} was removed from **{message.chat.title}** "
-                        f"because it was already posted by another user."
-                    )
-                except:
-                    pass  # User has blocked bot
-                
-                print(f"[DEDUPE] Removed duplicate {media_type} from user {user_id} in chat {chat_id}")
+                logger.info("[DEDUPE] Removed duplicate %s from user %s in chat %s", media_type, user_id, chat_id)
                 return
             except Exception as e:
-                print(f"[DEDUPE] Failed to delete duplicate: {e}")
-    
-    # Save hash to prevent future duplicates
-    await save_media_hash(chat_id, file_hash, user_id, message.id)
+                logger.warning("[DEDUPE] Failed to delete duplicate: %s", e)
     
-    # Increment user's media count
-    await increment_user_media(chat_id, user_id, media_type)
+    # Save hash to prevent future duplicates and increment the user's count
+    queue_media_write(chat_id, file_unique_id, user_id, message.id, media_type)
 
 # ==================== COMMAND HANDLERS ====================
 
@@ -231,7 +543,7 @@ async def dedupe_command(_, message: Message):
     
     if not args or args[0].lower() == "status":
         # Show status
-        enabled = await is_dedupe_enabled(message.chat.id)
+        enabled = await dedupe_enabled(message.chat.id)
         status = "✅ **Enabled**" if enabled else "❌ **Disabled**"
         
         await message.reply_text(
@@ -244,13 +556,13 @@ async def dedupe_command(_, message: Message):
     action = args[0].lower()
     
     if action in ["on", "enable", "yes", "1"]:
-        await set_dedupe_enabled(message.chat.id, True)
+        await set_dedupe(message.chat.id, True)
         await message.reply_text(
             "✅ **Deduplication Enabled**\n\n"
             "Duplicate photos and videos will be automatically removed."
         )
     elif action in ["off", "disable", "no", "0"]:
-        await set_dedupe_enabled(message.chat.id, False)
+        await set_dedupe(message.chat.id, False)
         await message.reply_text(
             "❌ **Deduplication Disabled**\n\n"
             "Duplicate media will no longer be removed."
@@ -333,19 +645,17 @@ async def count_command(_, message: Message):
 @app.on_message(filters.command("leaderboard") & filters.group)
 async def leaderboard_command(_, message: Message):
     """Show media leaderboard."""
-    is_admin = await is_admin_or_sudo(message.chat.id, message.from_user.id)
-    
     # Check for 'full' argument (admin only)
-    show_full = False
-    if len(message.command) > 1 and message.command[1].lower() == "full":
-        if is_admin:
-            show_full = True
-        else:
-            await message.reply_text("❌ Only admins can view the full leaderboard!")
-            return
+    show_full = len(message.command) > 1 and message.command[1].lower() == "full"
+    if show_full and not await is_admin_or_sudo(message.chat.id, message.from_user.id):
+        await message.reply_text("❌ Only admins can view the full leaderboard!")
+        return
     
     limit = 20 if show_full else 10
-    leaders = await get_media_leaderboard(message.chat.id, limit)
+    leaders, chat_stats = await asyncio.gather(
+        get_media_leaderboard(message.chat.id, limit),
+        get_chat_media_stats(message.chat.id)
+    )
     
     if not leaders:
         await message.reply_text(
@@ -357,29 +667,26 @@ async def leaderboard_command(_, message: Message):
     text = "🏆 **Media Leaderboard**\n"
     text += f"Top {len(leaders)} Contributors\n\n"
     
+    mentions = await get_mentions([leader["user_id"] for leader in leaders])
+    
     for i, leader in enumerate(leaders, 1):
-        rank_emoji = RANK_EMOJIS.get(i, f"{i}.")
+        rank_emoji = RANK_EMOJIS[i] if i < len(RANK_EMOJIS) else f"{i}."
         user_id = leader["user_id"]
         total = leader.get("total", 0)
         photos = leader.get("photos", 0)
         videos = leader.get("videos", 0)
-        
-        try:
-            user = await app.get_users(user_id)
-            name = user.mention
-        except:
-            name = f"User {user_id}"
+        name = mentions.get(user_id, f"User {user_id}")
         
         text += f"{rank_emoji} {name}\n"
         text += f"   📊 {total} total (📷 {photos} • 🎬 {videos})\n\n"
     
     # Add footer
-    chat_stats = await get_chat_media_stats(message.chat.id)
     text += f"━━━━━━━━━━━━━━━\n"
     text += f"📈 Total: {chat_stats['total_media']} media\n"
     text += f"👥 Active users: {chat_stats['active_users']}"
     
-    if not show_full and is_admin:
+    # Hint for admins (cached admin set, no API call)
+    if not show_full and await is_admin_or_sudo(message.chat.id, message.from_user.id):
         text += "\n\n💡 Use `/leaderboard full` for top 20"
     
     await message.reply_text(text)
@@ -390,10 +697,12 @@ async def media_stats_command(_, message: Message):
     if not await is_admin_or_sudo(message.chat.id, message.from_user.id):
         return await message.reply_text("❌ This command is for admins only!")
     
-    stats = await get_chat_media_stats(message.chat.id)
-    dedupe_enabled = await is_dedupe_enabled(message.chat.id)
+    stats, enabled = await asyncio.gather(
+        get_chat_media_stats(message.chat.id),
+        dedupe_enabled(message.chat.id)
+    )
     
-    dedupe_status = "✅ Enabled" if dedupe_enabled else "❌ Disabled"
+    dedupe_status = "✅ Enabled" if enabled else "❌ Disabled"
     
     await message.reply_text(
         f"📊 **Chat Media Statistics**\n\n"
@@ -434,31 +743,9 @@ async def kick50_command(_, message: Message):
         f"Starting removal process..."
     )
     
-    kicked_count = 0
-    failed_count = 0
-    
-    for user_id in low_media_users:
-        try:
-            # Don't kick admins or sudo users
-            if await is_admin_or_sudo(message.chat.id, user_id):
-                continue
-            
-            # Kick user
-            await app.ban_chat_member(message.chat.id, user_id)
-            await asyncio.sleep(0.5)  # Rate limiting
-            await app.unban_chat_member(message.chat.id, user_id)
-            kicked_count += 1
-            
-            # Update progress every 10 kicks
-            if kicked_count % 10 == 0:
-                await msg.edit_text(
-                    f"⏳ Progress: {kicked_count}/{len(low_media_users)} removed..."
-                )
-            
-        except Exception as e:
-            failed_count += 1
-            print(f"[KICK50] Failed to kick user {user_id}: {e}")
-            continue
+    kicked_count, failed_count = await kick_users(
+        message.chat.id, low_media_users, msg, "KICK50"
+    )
     
     await msg.edit_text(
         f"✅ **Removal Complete**\n\n"
@@ -520,31 +807,9 @@ async def inactive_kick_command(_, message: Message):
         f"Starting removal process..."
     )
     
-    kicked_count = 0
-    failed_count = 0
-    
-    for user_id in inactive_users:
-        try:
-            # Don't kick admins or sudo users
-            if await is_admin_or_sudo(message.chat.id, user_id):
-                continue
-            
-            # Kick user
-            await app.ban_chat_member(message.chat.id, user_id)
-            await asyncio.sleep(0.5)
-            await app.unban_chat_member(message.chat.id, user_id)
-            kicked_count += 1
-            
-            # Update progress
-            if kicked_count % 10 == 0:
-                await msg.edit_text(
-                    f"⏳ Progress: {kicked_count}/{len(inactive_users)} removed..."
-                )
-            
-        except Exception as e:
-            failed_count += 1
-            print(f"[INACTIVEKICK] Failed to kick user {user_id}: {e}")
-            continue
+    kicked_count, failed_count = await kick_users(
+        message.chat.id, inactive_users, msg, "INACTIVEKICK"
+    )
     
     await msg.edit_text(
         f"✅ **Removal Complete**\n\n"
@@ -582,14 +847,8 @@ async def scan_inactive_command(_, message: Message):
     
     # Get first 10 users for preview
     preview_users = inactive_users[:10]
-    user_mentions = []
-    
-    for user_id in preview_users:
-        try:
-            user = await app.get_users(user_id)
-            user_mentions.append(user.mention)
-        except:
-            user_mentions.append(f"User {user_id}")
+    mentions = await get_mentions(preview_users)
+    user_mentions = [mentions.get(u, f"User {u}") for u in preview_users]
     
     text = f"📊 **Inactive Users Preview**\n\n"
     text += f"Found **{len(inactive_users)}** users inactive for {time_str}\n\n"
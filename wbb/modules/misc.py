@@ -68,8 +68,9 @@ __HELP__ = """
 /markdownhelp
     Sends mark down and formatting help.
 
-/backup
-    Backup database
+/backup [0-9|lzma|bzip2]
+    Backup database. 0-9 sets the deflate level (default 1, fastest);
+    lzma and bzip2 are several times slower but give smaller archives.
 
 /ping
     Check ping of all 5 DCs.
@@ -5,73 +5,145 @@ Creates/restores backups of the SQLite database file used by the bot.
 """
 
 import asyncio
+import io
+import mmap
+import os
 import shutil
+import sqlite3
+import tempfile
 import zipfile
 from pathlib import Path
 
-from pyrogram import enums, filters
+from pyrogram import filters
 from pyrogram.types import Message
 
-from wbb import SUDOERS_SET, app
+from wbb import SUDOERS, app
 
 DB_FILE = Path("wbb.sqlite")
+COPY_BUFSIZE = 1 << 20
+# Scratch files are short-lived; keep them in RAM where the host allows
+TMP_DIR = Path("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+BACKUP_METHODS = {"lzma": zipfile.ZIP_LZMA, "bzip2": zipfile.ZIP_BZIP2}
 
+BACKUP_CMD = filters.command("backup") & filters.private & SUDOERS
+RESTORE_CMD = filters.command("restore") & filters.private & SUDOERS
 
-@app.on_message(filters.command("backup") & filters.user(list(SUDOERS_SET)))
+
+def copy_mapped(src, dst):
+    """Write a file to dst straight from a read-only mapping, in
+    COPY_BUFSIZE slices, so no read() copies it into Python first."""
+    if not os.fstat(src.fileno()).st_size:
+        return
+    with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with memoryview(mm) as view:
+            for i in range(0, len(view), COPY_BUFSIZE):
+                dst.write(view[i : i + COPY_BUFSIZE])
+
+
+def checkpoint_db(path):
+    """Fold the WAL back into the database file and truncate it.
+
+    Returns False if another connection kept the checkpoint from finishing.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        busy, _, _ = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    finally:
+        conn.close()
+    return not busy
+
+
+@app.on_message(BACKUP_CMD)
 async def backup(_, message: Message):
-    if message.chat.type != enums.ChatType.PRIVATE:
-        return await message.reply("This command can only be used in private")
+    # /backup [0-9|lzma|bzip2]: deflate level 0 stores, 1 (default) is
+    # fast, 9 is smallest; lzma is slower still but smaller again
+    arg = message.command[1].lower() if len(message.command) > 1 else ""
+    if arg in BACKUP_METHODS:
+        compression, level = BACKUP_METHODS[arg], None
+    else:
+        try:
+            level = min(max(int(arg), 0), 9)
+        except ValueError:
+            level = 1
+        compression = zipfile.ZIP_DEFLATED if level else zipfile.ZIP_STORED
 
     m = await message.reply("Backing up SQLite database...")
 
     if not DB_FILE.exists():
         return await m.edit("No SQLite database found (wbb.sqlite).")
 
-    backup_zip = Path("backup_sqlite.zip")
-    if backup_zip.exists():
-        backup_zip.unlink()
-
     def create_zip():
-        with zipfile.ZipFile(backup_zip, "w", zipfile.ZIP_DEFLATED) as zf:
-            zf.write(DB_FILE, DB_FILE.name)
-
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None, create_zip)
-
-    await message.reply_document(str(backup_zip))
+        with tempfile.TemporaryDirectory(dir=TMP_DIR) as tmp:
+            # VACUUM INTO reads a consistent view, WAL included, and writes
+            # only live pages, so there is less to compress than the raw file
+            snapshot = Path(tmp) / DB_FILE.name
+            conn = sqlite3.connect(DB_FILE)
+            try:
+                conn.execute("VACUUM INTO ?", (str(snapshot),))
+            finally:
+                conn.close()
+            # Built in memory and uploaded from there
+            buf = io.BytesIO()
+            zf = zipfile.ZipFile(buf, "w", compression, compresslevel=level)
+            with zf, open(snapshot, "rb", buffering=0) as src, zf.open(
+                DB_FILE.name, "w", force_zip64=True
+            ) as dst:
+                copy_mapped(src, dst)
+        buf.name = "backup_sqlite.zip"
+        buf.seek(0)
+        return buf
+
+    await message.reply_document(await asyncio.to_thread(create_zip))
     await m.delete()
 
 
-@app.on_message(filters.command("restore") & filters.user(list(SUDOERS_SET)))
+@app.on_message(RESTORE_CMD)
 async def restore(_, message: Message):
-    if message.chat.type != enums.ChatType.PRIVATE:
-        return await message.reply("This command can only be used in private")
-
     if not message.reply_to_message or not message.reply_to_message.document:
         return await message.reply("Reply to a backup file (zip) with /restore")
 
     m = await message.reply("Restoring SQLite database...")
 
-    backup_file = await message.reply_to_message.download()
-    backup_path = Path(backup_file)
+    # Kept in memory: the archive is only read once, by do_restore
+    backup_file = await message.reply_to_message.download(in_memory=True)
+
+    def do_restore():
+        # Decompress next to the live file and swap it in, so the data is
+        # written once and a bad archive never leaves a half-written
+        # database; a private directory keeps concurrent restores apart.
+        # The directory is only made once the upload has opened as a zip.
+        with zipfile.ZipFile(backup_file, "r") as zf, tempfile.TemporaryDirectory(
+            prefix="wbb_restore_", dir=DB_FILE.parent
+        ) as tmp:
+            try:
+                src = zf.open(DB_FILE.name)
+            except KeyError:
+                return "Backup zip does not contain wbb.sqlite"
+            restored_db = Path(tmp) / DB_FILE.name
+            with src, open(restored_db, "wb") as dst:
+                shutil.copyfileobj(src, dst, COPY_BUFSIZE)
+                dst.flush()
+                os.fsync(dst.fileno())
+                # Only the restarted bot reads it again; don't hold it in cache
+                if hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(
+                        dst.fileno(), 0, 0, os.POSIX_FADV_DONTNEED
+                    )
+            # Empty the old database's WAL first, so nothing still in use is
+            # lost when it is removed below
+            if DB_FILE.exists() and not checkpoint_db(DB_FILE):
+                return "Database is busy, try /restore again in a moment."
+            os.replace(restored_db, DB_FILE)
+
+        # A leftover WAL belongs to the old database; never replay it on the new one
+        for suffix in ("-wal", "-shm"):
+            Path(f"{DB_FILE}{suffix}").unlink(missing_ok=True)
+        return None
 
     try:
-        extract_dir = Path("restore_tmp")
-        if extract_dir.exists():
-            shutil.rmtree(extract_dir)
-        extract_dir.mkdir(parents=True, exist_ok=True)
-
-        with zipfile.ZipFile(backup_path, "r") as zf:
-            zf.extractall(extract_dir)
-
-        extracted_db = extract_dir / DB_FILE.name
-        if not extracted_db.exists():
-            return await m.edit("Backup zip does not contain wbb.sqlite")
-
-        shutil.move(str(extracted_db), str(DB_FILE))
-        await m.edit("Restore complete. Restart the bot to apply changes.")
-    finally:
-        if backup_path.exists():
-            backup_path.unlink()
-        if extract_dir.exists():
-            shutil.rmtree(extract_dir)
+        error = await asyncio.to_thread(do_restore)
+    except zipfile.BadZipFile:
+        error = "That file is not a valid zip backup."
+    if error:
+        return await m.edit(error)
+    await m.edit("Restore complete. Restart the bot to apply changes.")
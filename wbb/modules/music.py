@@ -2,13 +2,13 @@
 Music Downloader Module for Telegram
 
 A high-performance music downloader with caching support for Telegram bots.
-Supports YouTube and YouTube Music with automatic format conversion to MP3.
+Supports YouTube and YouTube Music, sending the source audio stream as-is.
 
 Features:
 - Multi-source fallback (YouTube → YouTube Music → SoundCloud)
 - Smart caching with exact query matching
 - Support for age-restricted content via cookies
-- MP3 format for maximum compatibility
+- Native M4A/Opus audio, remuxed without re-encoding
 - Automatic command cleanup
 - Robust error recovery
 """
@@ -21,15 +21,22 @@ import json
 import random
 import shutil
 import tempfile
+import threading
 import time
-from functools import partial
+from contextlib import contextmanager
+from functools import lru_cache, partial
 from pathlib import Path
+from collections import OrderedDict
 from typing import Dict, List, Optional, Tuple, Union
 
+import aiohttp
+
 # Bot imports
-from wbb import app, SUDOERS, arq
+from wbb import app, SUDOERS, aiohttpsession, arq
 from wbb.utils.dbfunctions import (
-    get_cached_song, save_cached_song, delete_cached_song,
+    get_cached_song as db_get_cached_song,
+    save_cached_song as db_save_cached_song,
+    delete_cached_song as db_delete_cached_song,
     get_music_cache_count, get_recent_cached_songs, purge_music_cache
 )
 from wbb.core.storage import db
@@ -61,7 +68,7 @@ __HELP__ = """
 Download music from YouTube, YouTube Music, and SoundCloud with smart caching.
 
 **Commands:**
-- `/song <query>` - Search and download songs (MP3, cached)
+- `/song <query>` - Search and download songs (cached)
 - `/song! <query>` - Force fresh download (bypass cache)
 - `/ytmusic <query/link>` - YouTube Music download
 - `/lyrics <song>` - Get song lyrics
@@ -76,7 +83,7 @@ Download music from YouTube, YouTube Music, and SoundCloud with smart caching.
 ✅ Multi-source fallback (YouTube → YouTube Music → SoundCloud)
 ✅ Smart caching with exact query matching
 ✅ Age-restricted video support via cookies
-✅ MP3 format for maximum compatibility
+✅ Original audio quality, no re-encoding
 ✅ Automatic command cleanup
 ✅ Robust error recovery
 
@@ -104,6 +111,9 @@ MUSIC_CHANNEL_ID = int(os.getenv("MUSIC_CHANNEL_ID", "0")) or None
 MAX_DURATION = 3600  # 1 hour
 MAX_FILESIZE_MB = 100
 MIN_FILESIZE_BYTES = 50_000  # 50KB minimum valid file
+# Remuxed source formats; preferredcodec "best" keeps whatever codec the
+# source had, so this covers every container FFmpegExtractAudio may emit
+AUDIO_EXTS = [".m4a", ".opus", ".webm", ".mp3", ".ogg", ".flac", ".aac"]
 
 # Directories
 TEMP_DIR = Path(tempfile.gettempdir()) / "wbb_music"
@@ -111,8 +121,12 @@ TEMP_DIR.mkdir(parents=True, exist_ok=True)
 COOKIES_PATH = Path("/root/cookies/cookies.txt")
 
 # Concurrency
-GLOBAL_SEM = asyncio.Semaphore(10)  # Increased from 6 to 10
+GLOBAL_SEM = asyncio.BoundedSemaphore(10)  # Network-bound downloads
+# Video jobs may transcode to mp4; cap them at one per core
+FFMPEG_SEM = asyncio.BoundedSemaphore(os.cpu_count() or 2)
 DOWNLOAD_TIMEOUT = 180  # Reduced from 300 to 180 (3 minutes)
+SOURCE_HEDGE_DELAY = 20  # Start the next source if one is still running
+THUMB_TIMEOUT = aiohttp.ClientTimeout(total=5)
 
 # ==================== DATABASE ====================
 
@@ -123,6 +137,9 @@ USER_AGENTS = [
     "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_0) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Safari/605.1.15",
     "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
 ]
+# Picked once per process: the UA is part of the options a pooled
+# YoutubeDL is keyed on, so a per-call choice would defeat the pool
+VIDEO_USER_AGENT = random.choice(USER_AGENTS)
 
 # ==================== INVIDIOUS INSTANCES ====================
 
@@ -135,46 +152,69 @@ INVIDIOUS_INSTANCES = [
 
 # ==================== HELPER FUNCTIONS ====================
 
-def setup_ytdlp_config():
-    """Create clean yt-dlp config to prevent interference."""
-    config_dir = Path.home() / ".config" / "yt-dlp"
-    config_dir.mkdir(parents=True, exist_ok=True)
-    config_file = config_dir / "config"
-    if not config_file.exists():
-        config_file.write_text("# Auto-generated - minimal config\n")
-
-setup_ytdlp_config()
-
 def human_time(sec: int) -> str:
     """Convert seconds to human readable format."""
     return str(datetime.timedelta(seconds=int(sec)))
 
+class _CharTable(dict):
+    """str.translate table that decides each code point once, on first use."""
+
+    def __init__(self, keep, replacement: Optional[str] = None):
+        super().__init__()
+        self.keep = keep
+        self.replacement = replacement
+
+    def __missing__(self, cp: int):
+        self[cp] = value = cp if self.keep(chr(cp)) else self.replacement
+        return value
+
+_SAFE_FILENAME = _CharTable(lambda c: c.isalnum() or c in " -_.()")
+_TEMPLATE_CHARS = frozenset(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_%.(){}"
+)
+_SAFE_TEMPLATE = _CharTable(_TEMPLATE_CHARS.__contains__, "_")
+
 def safe_filename(s: str) -> str:
     """Create a safe filename from string."""
-    return "".join(c for c in s if c.isalnum() or c in (" ", "-", "_", ".", "(", ")")).strip()[:180]
+    return s.translate(_SAFE_FILENAME).strip()[:180]
 
 def sanitize_template(name: str) -> str:
     """Sanitize yt-dlp template strings while preserving placeholders."""
-    allowed = set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_%.(){}")
-    return "".join(ch if ch in allowed else "_" for ch in name)
+    return name.translate(_SAFE_TEMPLATE)
 
+_WS = re.compile(r'\s+')
+_NOISE_PAREN = re.compile(r'\(.*?\)|\[.*?\]')
+_NOISE_WORDS = re.compile(
+    r'\b(lyrics|official.*?video?|official.*?audio|official|video|audio|hd|hq|4k|full|song|track)\b',
+    re.IGNORECASE,
+)
+# Substrings every _NOISE_WORDS match contains; cheap pre-check for it
+_NOISE_HINTS = (
+    "lyrics", "official", "video", "audio", "hd", "hq", "4k", "full", "song", "track",
+)
+
+@lru_cache(maxsize=1024)
 def normalize_query(query: str) -> str:
     """Normalize query for exact matching."""
-    return re.sub(r'\s+', ' ', query.lower().strip())
+    return _WS.sub(' ', query.lower().strip())
 
+@lru_cache(maxsize=1024)
 def normalize_song_query(q: str) -> str:
     """Normalize search query for better matching."""
     if q.startswith(("http://", "https://")):
         return q
     
-    # Remove noise
-    q = re.sub(r'\(.*?\)|\[.*?\]', '', q)
-    q = re.sub(r'\b(lyrics|official.*?video?|official.*?audio|official|video|audio|hd|hq|4k|full|song|track)\b', 
-               '', q, flags=re.IGNORECASE)
+    # Remove noise; most queries contain none, so skip the regexes when
+    # neither brackets nor any noise word can be present
+    lowered = q.lower()
+    if "(" in q or "[" in q or any(w in lowered for w in _NOISE_HINTS):
+        q = _NOISE_PAREN.sub('', q)
+        q = _NOISE_WORDS.sub('', q)
     
     # Clean and add hint for short queries
-    q = ' '.join(q.split()).strip()
-    if len(q.split()) <= 2 and not q.startswith(("http://", "https://")):
+    words = q.split()
+    q = ' '.join(words)
+    if len(words) <= 2 and not q.startswith(("http://", "https://")):
         q += " official audio"
     
     return q
@@ -183,37 +223,29 @@ def is_sudo(user_id: int) -> bool:
     """Check if user is sudo."""
     return user_id in SUDOERS_SET
 
-def is_valid_audio(path: Path) -> bool:
-    """Validate audio file integrity (quick check)."""
-    if not path.exists() or path.stat().st_size < MIN_FILESIZE_BYTES:
-        return False
-    # Skip ffprobe validation for speed - just check size
-    return True
-
-def debug_file_info(file_path: str, prefix: str = ""):
-    """Debug helper to log file information."""
-    try:
-        p = Path(file_path)
-        if not p.exists():
-            print(f"[DEBUG {prefix}] ❌ File does not exist: {file_path}")
-            return False
-        
-        size = p.stat().st_size
-        print(f"[DEBUG {prefix}] ✓ File: {file_path}")
-        print(f"[DEBUG {prefix}] ✓ Size: {size:,} bytes ({size/1024/1024:.2f} MB)")
-        
-        return is_valid_audio(p)
-    except Exception as e:
-        print(f"[DEBUG {prefix}] ❌ Error: {e}")
-        return False
-
 # ==================== CACHE MANAGEMENT ====================
 
+# Hot exact-match lookups, kept in front of SQLite: query -> (stored_at, row)
+_QUERY_CACHE: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+_QUERY_CACHE_MAX = 500
+_QUERY_CACHE_TTL = 600
+
 async def get_cached_song(query: str, exact_only: bool = True) -> Optional[Dict]:
     """Get cached song by query with access tracking (SQLite)."""
     query_norm = normalize_query(query)
 
-    data = await get_cached_song(query_norm, exact_only)
+    if exact_only:
+        hit = _QUERY_CACHE.get(query_norm)
+        if hit and time.time() - hit[0] < _QUERY_CACHE_TTL:
+            _QUERY_CACHE.move_to_end(query_norm)
+            return hit[1]
+
+    data = await db_get_cached_song(query_norm, exact_only)
+    if data and exact_only:
+        _QUERY_CACHE[query_norm] = (time.time(), data)
+        _QUERY_CACHE.move_to_end(query_norm)
+        if len(_QUERY_CACHE) > _QUERY_CACHE_MAX:
+            _QUERY_CACHE.popitem(last=False)
     return data
 
 async def save_cached_song(
@@ -227,16 +259,18 @@ async def save_cached_song(
 ):
     """Save song to cache with file_id for instant retrieval (SQLite)."""
     normalized_query = normalize_query(query)
-    now = int(time.time())
+    _QUERY_CACHE.pop(normalized_query, None)
 
-    await save_cached_song(
+    await db_save_cached_song(
         normalized_query, title, performer, duration, file_id, thumb_file_id, storage_msg_id
     )
     print(f"[CACHE] Saved: '{normalized_query}' -> file_id: {file_id[:20]}...")
 
 async def delete_cached_song(query: str):
     """Delete cached song by exact query match."""
-    await delete_cached_song(query)
+    query_norm = normalize_query(query)
+    _QUERY_CACHE.pop(query_norm, None)
+    await db_delete_cached_song(query_norm)
 
 # ==================== YT-DLP OPTIONS ====================
 
@@ -248,13 +282,10 @@ def get_base_opts(cookiefile: Optional[str] = None) -> Dict:
         "noplaylist": True,
         "quiet": True,
         "no_warnings": True,
+        # "best" keeps the source codec, so ffmpeg only remuxes the stream
         "postprocessors": [
-            {
-                "key": "FFmpegExtractAudio",
-                "preferredcodec": "mp3",
-                "preferredquality": "192"
-            },
-            {"key": "FFmpegMetadata"}  # Preserve metadata
+            {"key": "FFmpegExtractAudio", "preferredcodec": "best"},
+            {"key": "FFmpegMetadata"},  # Preserve metadata
         ],
         "socket_timeout": 30,
         "retries": 3,
@@ -288,25 +319,6 @@ def get_audio_m4a_opts(tmpdir: Path, cookiefile: Optional[str] = None) -> Dict:
     opts.update({
         "format": "bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio/best",
         "outtmpl": str(tmpdir / "%(id)s.%(ext)s"),
-        "postprocessors": [{
-            "key": "FFmpegExtractAudio",
-            "preferredcodec": "mp3",
-            "preferredquality": "192",  # Higher quality for music
-        }],
-    })
-    return opts
-
-def get_audio_mp3_opts(tmpdir: Path, cookiefile: Optional[str] = None) -> Dict:
-    """Get MP3 audio download options (fallback - requires re-encoding)."""
-    opts = get_base_opts(cookiefile)
-    opts.update({
-        "format": "bestaudio/best",
-        "outtmpl": str(tmpdir / "%(id)s.%(ext)s"),
-        "postprocessors": [{
-            "key": "FFmpegExtractAudio",
-            "preferredcodec": "mp3",
-            "preferredquality": "192",  # Higher quality for music
-        }],
     })
     return opts
 
@@ -323,7 +335,7 @@ def get_video_opts(tmpdir: Path, cookiefile: Optional[str] = None) -> Dict:
         "fragment_retries": 3,
         "merge_output_format": "mp4",
         "prefer_ffmpeg": True,
-        "http_headers": {"User-Agent": random.choice(USER_AGENTS)},
+        "http_headers": {"User-Agent": VIDEO_USER_AGENT},
         "postprocessors": [
             {
                 "key": "FFmpegVideoConvertor",
@@ -341,13 +353,62 @@ def get_video_opts(tmpdir: Path, cookiefile: Optional[str] = None) -> Dict:
         opts["cookiefile"] = cookiefile
     return opts
 
+# ==================== YT-DLP POOL ====================
+
+# Idle YoutubeDL instances keyed by their options (minus outtmpl). Building
+# one loads every extractor and sets up the HTTP session, so reuse them;
+# each instance is checked out by one download at a time.
+_YDL_POOL: Dict[str, List[YoutubeDL]] = {}
+_YDL_POOL_IDLE_MAX = 4  # idle instances kept per option set
+_YDL_LOCK = threading.Lock()
+
+@contextmanager
+def pooled_ydl(opts: Dict):
+    """Check out a YoutubeDL for opts, with outtmpl applied for this call."""
+    if opts.get("cookiefile"):
+        # The cookie jar is mutable and written back on close; don't share it
+        with YoutubeDL(opts) as ydl:
+            yield ydl
+        return
+
+    shared = {k: v for k, v in opts.items() if k != "outtmpl"}
+    key = hashlib.md5(
+        json.dumps(shared, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    with _YDL_LOCK:
+        idle = _YDL_POOL.setdefault(key, [])
+        ydl = idle.pop() if idle else None
+    if ydl is None:
+        ydl = YoutubeDL(opts)
+    ydl.params["outtmpl"] = {"default": opts["outtmpl"]}
+    try:
+        yield ydl
+    finally:
+        with _YDL_LOCK:
+            idle = _YDL_POOL.setdefault(key, [])
+            if len(idle) < _YDL_POOL_IDLE_MAX:
+                idle.append(ydl)
+                ydl = None
+        if ydl is not None:
+            ydl.close()
+
+def close_ydl_pool():
+    """Close every idle pooled YoutubeDL."""
+    with _YDL_LOCK:
+        pooled = [ydl for idle in _YDL_POOL.values() for ydl in idle]
+        _YDL_POOL.clear()
+    for ydl in pooled:
+        ydl.close()
+
 # ==================== SEARCH QUERY BUILDERS ====================
 
 def build_yt_search(query: str) -> str:
     """Build YouTube search query."""
     if query.startswith(("http://", "https://")):
         return query
-    return f"ytsearch1:{normalize_song_query(query)}"  # Changed from ytsearch5 to ytsearch1 for speed
+    # Explicit prefix: default_search is skipped for queries like "Re:Zero"
+    # that urlparse reads as having a scheme
+    return f"ytsearch1:{normalize_song_query(query)}"
 
 def build_ytmusic_search(query: str) -> str:
     """Build YouTube Music search query."""
@@ -361,8 +422,64 @@ def build_soundcloud_search(query: str) -> str:
         return query
     return f"scsearch1:{normalize_song_query(query)}"  # Changed from 5 to 1
 
+# ==================== TEMP CLEANUP ====================
+
+# Download directories are removed by one background worker so rmtree
+# never runs on the event loop
+_CLEANUP_QUEUE: "asyncio.Queue[str]" = asyncio.Queue()
+_cleanup_worker_task: Optional[asyncio.Task] = None
+
+async def _cleanup_worker():
+    """Remove queued temp directories in the executor, one at a time."""
+    loop = asyncio.get_running_loop()
+    while True:
+        path = await _CLEANUP_QUEUE.get()
+        await loop.run_in_executor(
+            None, partial(shutil.rmtree, path, ignore_errors=True)
+        )
+
+def schedule_cleanup(path: Union[str, Path]):
+    """Queue a temp directory for removal by the background worker."""
+    global _cleanup_worker_task
+    _CLEANUP_QUEUE.put_nowait(str(path))
+    if _cleanup_worker_task is None or _cleanup_worker_task.done():
+        _cleanup_worker_task = asyncio.create_task(_cleanup_worker())
+
+# ==================== THUMBNAILS ====================
+
+def pick_thumbnail(info: Dict) -> Optional[str]:
+    """Pick the largest JPEG thumbnail Telegram accepts (at most 320px wide)."""
+    best_width, best_url = 0, None
+    for thumb in info.get("thumbnails") or ():
+        width = thumb.get("width") or 0
+        url = thumb.get("url") or ""
+        if best_width < width <= 320 and url.split("?", 1)[0].endswith(".jpg"):
+            best_width, best_url = width, url
+    return best_url
+
+async def fetch_thumbnail(url: Optional[str], tmpdir: str) -> Optional[str]:
+    """Download a thumbnail into tmpdir; None if there is none or it fails."""
+    if not url:
+        return None
+    path = Path(tmpdir) / "thumb.jpg"
+    try:
+        async with aiohttpsession.get(url, timeout=THUMB_TIMEOUT) as resp:
+            if resp.status != 200:
+                return None
+            path.write_bytes(await resp.read())
+        return str(path)
+    except Exception as e:
+        print(f"[THUMB] Failed to fetch thumbnail: {str(e)[:100]}")
+        return None
+
 # ==================== DOWNLOAD FUNCTIONS ====================
 
+def find_output(tmpdir: Path, exts) -> Optional[Path]:
+    """Return a file in tmpdir with the earliest-listed extension, or None."""
+    with os.scandir(tmpdir) as it:
+        found = {Path(e.name).suffix: Path(e.path) for e in it if e.is_file()}
+    return next((found[ext] for ext in exts if ext in found), None)
+
 def _download_blocking(search: str, opts: Dict, tmpdir: Path, 
                        allowed_exts: List[str]) -> Dict:
     """
@@ -377,41 +494,37 @@ def _download_blocking(search: str, opts: Dict, tmpdir: Path,
     Returns:
         Dict with metadata: {
             "file": str,       # Path to downloaded file
+            "size": int,       # File size in bytes
             "title": str,      # Title of the media
             "performer": str,  # Artist/uploader name
             "duration": int,   # Duration in seconds
             "tmpdir": str,     # Temporary directory path
-            "thumb_url": str   # URL to thumbnail (optional)
+            "thumb_url": str   # URL to a Telegram-sized JPEG thumbnail (optional)
         }
     """
-    with YoutubeDL(opts) as ydl:
+    with pooled_ydl(opts) as ydl:
         info = ydl.extract_info(search, download=True)
         if "entries" in info:
             info = info["entries"][0]
     
     # Find downloaded file
-    files = []
-    for ext in allowed_exts:
-        files.extend(tmpdir.glob(f"*{ext}"))
-        if files:
-            break
-    
-    if not files:
+    file = find_output(tmpdir, allowed_exts)
+    if file is None:
         raise RuntimeError(f"Download produced no files with extensions: {allowed_exts}")
     
-    file = files[0]
-    
-    # Validate file
-    if not is_valid_audio(file):
+    # Validate file; the size is returned so callers needn't stat it again
+    size = file.stat().st_size
+    if size < MIN_FILESIZE_BYTES:
         raise RuntimeError(f"Downloaded file is invalid: {file.name}")
     
     return {
         "file": str(file),
+        "size": size,
         "title": info.get("title", file.stem)[:64],
         "performer": (info.get("artist") or info.get("uploader") or "Unknown")[:64],
         "duration": int(info.get("duration", 0)),
         "tmpdir": str(tmpdir),
-        "thumb_url": info.get("thumbnail"),
+        "thumb_url": pick_thumbnail(info),
     }
 
 def _download_video_blocking(search: str, tmpdir: Path, cookiefile: Optional[str]) -> Dict:
@@ -419,7 +532,7 @@ def _download_video_blocking(search: str, tmpdir: Path, cookiefile: Optional[str
     opts = get_video_opts(tmpdir, cookiefile)
 
     def run_download(current_opts: Dict) -> Dict:
-        with YoutubeDL(current_opts) as ydl:
+        with pooled_ydl(current_opts) as ydl:
             extracted = ydl.extract_info(search, download=True)
         if "entries" in extracted:
             extracted = extracted["entries"][0]
@@ -436,17 +549,10 @@ def _download_video_blocking(search: str, tmpdir: Path, cookiefile: Optional[str
         fallback_opts = {**opts, "format": "best", "postprocessors": opts.get("postprocessors", [])}
         info = run_download(fallback_opts)
 
-    files: List[Path] = []
-    for ext in (".mp4", ".mkv", ".webm"):
-        files.extend(tmpdir.glob(f"*{ext}"))
-        if files:
-            break
-
-    if not files:
+    file_path = find_output(tmpdir, (".mp4", ".mkv", ".webm"))
+    if file_path is None:
         raise RuntimeError("Download produced no video files")
 
-    file_path = files[0]
-
     return {
         "file": str(file_path),
         "title": info.get("title", file_path.stem)[:100],
@@ -473,109 +579,134 @@ async def download_audio(query: str, sources: List[str] = None) -> Dict:
     
     cookiefile = str(COOKIES_PATH) if COOKIES_PATH.exists() else None
     last_error = None
-    
-    # Try each source
-    for source in sources:
-        try:
+    remaining = iter(sources)
+    pending: Dict[asyncio.Task, str] = {}
+
+    def start_next() -> bool:
+        for source in remaining:
             print(f"[DOWNLOAD] Trying source: {source}")
-            
             if source == "youtube":
-                return await download_audio_youtube(query, cookiefile)
+                coro = download_audio_youtube(query, cookiefile)
             elif source == "ytmusic":
-                return await download_audio_ytmusic(query, cookiefile)
+                coro = download_audio_ytmusic(query, cookiefile)
             elif source == "soundcloud":
-                return await download_audio_soundcloud(query)
+                coro = download_audio_soundcloud(query)
             else:
                 print(f"[DOWNLOAD] Unknown source: {source}")
                 continue
-                
-        except Exception as e:
-            last_error = e
-            print(f"[DOWNLOAD] Source {source} failed: {str(e)[:100]}")
+            pending[asyncio.create_task(coro)] = source
+            return True
+        return False
+
+    # Sources run in preference order, but one that is still going after
+    # SOURCE_HEDGE_DELAY (e.g. stuck in YouTube 429 retries) gets the next
+    # source started alongside it; the first successful download wins
+    start_next()
+    while pending:
+        done, _ = await asyncio.wait(
+            pending, timeout=SOURCE_HEDGE_DELAY,
+            return_when=asyncio.FIRST_COMPLETED
+        )
+        if not done:
+            start_next()
             continue
+        for task in done:
+            source = pending.pop(task)
+            try:
+                result = task.result()
+            except Exception as e:
+                last_error = e
+                print(f"[DOWNLOAD] Source {source} failed: {str(e)[:100]}")
+                continue
+            # Executor downloads can't be interrupted; drop the losers' files
+            for other in pending:
+                other.add_done_callback(_discard_download)
+            return result
+        if not pending:
+            start_next()
     
     # All sources failed
     raise RuntimeError(f"All sources failed. Last error: {str(last_error)[:200]}")
 
+def _discard_download(task: asyncio.Task):
+    """Remove the files of a download that lost the race."""
+    if not task.cancelled() and task.exception() is None:
+        schedule_cleanup(task.result()["tmpdir"])
+
 async def download_audio_youtube(query: str, cookiefile: Optional[str] = None) -> Dict:
     """Download audio from YouTube."""
-    tmpdir = TEMP_DIR / f"yt_{int(time.time())}_{random.randint(1000, 9999)}"
-    tmpdir.mkdir(parents=True, exist_ok=True)
+    tmpdir = Path(tempfile.mkdtemp(prefix="yt_", dir=TEMP_DIR))
     
     search = build_yt_search(query)
     print(f"[YOUTUBE] Downloading: {query}")
     
-    # Use MP3 directly (more reliable than M4A)
     try:
-        opts = get_audio_mp3_opts(tmpdir, cookiefile)
+        opts = get_audio_m4a_opts(tmpdir, cookiefile)
         loop = asyncio.get_running_loop()
         result = await asyncio.wait_for(
             loop.run_in_executor(None, partial(_download_blocking, search, opts, 
-                                              tmpdir, [".mp3", ".m4a", ".webm"])),
+                                              tmpdir, AUDIO_EXTS)),
             timeout=DOWNLOAD_TIMEOUT
         )
         print(f"[YOUTUBE] Download successful")
         return result
     except asyncio.TimeoutError:
         print(f"[YOUTUBE] Download timed out")
-        shutil.rmtree(tmpdir, ignore_errors=True)
+        schedule_cleanup(tmpdir)
         raise
     except Exception as e:
         print(f"[YOUTUBE] Failed: {e}")
-        shutil.rmtree(tmpdir, ignore_errors=True)
+        schedule_cleanup(tmpdir)
         raise
 
 async def download_audio_ytmusic(query: str, cookiefile: Optional[str] = None) -> Dict:
     """Download audio from YouTube Music."""
-    tmpdir = TEMP_DIR / f"ytm_{int(time.time())}_{random.randint(1000, 9999)}"
-    tmpdir.mkdir(parents=True, exist_ok=True)
+    tmpdir = Path(tempfile.mkdtemp(prefix="ytm_", dir=TEMP_DIR))
     
     # YouTube Music doesn't work with ytmusicsearch, use regular ytsearch with "topic" hint
     search = f"ytsearch1:{normalize_song_query(query)} topic"  # Changed from 5 to 1
     print(f"[YTMUSIC] Downloading: {query}")
     
     try:
-        opts = get_audio_mp3_opts(tmpdir, cookiefile)
+        opts = get_audio_m4a_opts(tmpdir, cookiefile)
         loop = asyncio.get_running_loop()
         result = await asyncio.wait_for(
             loop.run_in_executor(None, partial(_download_blocking, search, opts, 
-                                              tmpdir, [".mp3", ".m4a", ".webm"])),
+                                              tmpdir, AUDIO_EXTS)),
             timeout=DOWNLOAD_TIMEOUT
         )
         print(f"[YTMUSIC] Download successful")
         return result
     except Exception as e:
         print(f"[YTMUSIC] Failed: {e}")
-        shutil.rmtree(tmpdir, ignore_errors=True)
+        schedule_cleanup(tmpdir)
         raise
 
 async def download_audio_soundcloud(query: str) -> Dict:
     """Download audio from SoundCloud."""
-    tmpdir = TEMP_DIR / f"sc_{int(time.time())}_{random.randint(1000, 9999)}"
-    tmpdir.mkdir(parents=True, exist_ok=True)
+    tmpdir = Path(tempfile.mkdtemp(prefix="sc_", dir=TEMP_DIR))
     
     search = build_soundcloud_search(query)
     print(f"[SOUNDCLOUD] Downloading: {query}")
     
     try:
-        opts = get_audio_mp3_opts(tmpdir)
+        opts = get_audio_m4a_opts(tmpdir)
         loop = asyncio.get_running_loop()
         result = await asyncio.wait_for(
             loop.run_in_executor(None, partial(_download_blocking, search, opts, 
-                                              tmpdir, [".mp3", ".m4a"])),
+                                              tmpdir, AUDIO_EXTS)),
             timeout=DOWNLOAD_TIMEOUT
         )
         print(f"[SOUNDCLOUD] Download successful")
         return result
     except Exception as e:
         print(f"[SOUNDCLOUD] Failed: {e}")
-        shutil.rmtree(tmpdir, ignore_errors=True)
+        schedule_cleanup(tmpdir)
         raise
 
 async def download_video(query: str) -> Dict:
     """Download full-size video from YouTube or URL."""
-    tmpdir = TEMP_DIR / f"vid_{int(time.time())}_{random.randint(1000,9999)}"
-    tmpdir.mkdir(parents=True, exist_ok=True)
+    tmpdir = Path(tempfile.mkdtemp(prefix="vid_", dir=TEMP_DIR))
 
     search = query if query.startswith(("http://", "https://")) else f"ytsearch1:{query}"
 
@@ -591,7 +722,7 @@ async def download_video(query: str) -> Dict:
         )
         return result
     except Exception as e:
-        shutil.rmtree(tmpdir, ignore_errors=True)
+        schedule_cleanup(tmpdir)
         raise e
 
 # ==================== STORAGE UPLOAD ====================
@@ -612,11 +743,11 @@ async def upload_to_storage(file_path: str, title: str, performer: str,
         Sent message object with the uploaded audio
     """
     # Validate file
-    file_path_obj = Path(file_path)
-    if not file_path_obj.exists():
+    try:
+        file_size = os.stat(file_path).st_size
+    except FileNotFoundError:
         raise RuntimeError(f"File not found: {file_path}")
     
-    file_size = file_path_obj.stat().st_size
     if file_size < MIN_FILESIZE_BYTES:
         raise RuntimeError(f"File too small ({file_size} bytes), likely corrupted")
     
@@ -665,15 +796,11 @@ async def song_handler(_, m: Message):
             cached = await get_cached_song(query, exact_only=True)
             if cached:
                 try:
-                    file_id = cached.get("file_id")
-                    title = cached.get("title")
-                    await msg.edit(f"✅ Found in cache: **{title}**")
-                    await m.reply_audio(file_id)
-                    await msg.delete()
-                    try:
-                        await m.delete()
-                    except:
-                        pass
+                    await m.reply_audio(cached.get("file_id"))
+                    # The user has the audio; drop both messages in one go
+                    await asyncio.gather(
+                        msg.delete(), m.delete(), return_exceptions=True
+                    )
                     print(f"[CACHE HIT] Served from cache: {query}")
                     return
                 except Exception as e:
@@ -694,45 +821,59 @@ async def song_handler(_, m: Message):
             if not result or not result.get("file"):
                 raise RuntimeError("Download failed - no file returned")
             
-            file_path = Path(result["file"])
-            if not file_path.exists():
-                raise RuntimeError(f"Downloaded file not found: {file_path}")
-            
-            if file_path.stat().st_size < MIN_FILESIZE_BYTES:
+            if result.get("size", 0) < MIN_FILESIZE_BYTES:
                 raise RuntimeError(f"Downloaded file too small, likely corrupted")
             
-            # Upload to storage
-            storage_id = MUSIC_GROUP_ID or MUSIC_CHANNEL_ID
-            if storage_id:
-                try:
-                    await msg.edit("📤 Uploading to storage...")
-                    sent = await upload_to_storage(
-                        result["file"], 
-                        result["title"], 
-                        result["performer"],
-                        result["duration"], 
-                        result.get("thumb_path")
-                    )
+            # Fetch the thumbnail while the status message is being edited
+            thumb_task = asyncio.create_task(
+                fetch_thumbnail(result.get("thumb_url"), result["tmpdir"])
+            )
+            
+            try:
+                # Upload to storage
+                storage_id = MUSIC_GROUP_ID or MUSIC_CHANNEL_ID
+                if storage_id:
+                    try:
+                        await msg.edit("📤 Uploading to storage...")
+                        result["thumb_path"] = await thumb_task
+                        sent = await upload_to_storage(
+                            result["file"], 
+                            result["title"], 
+                            result["performer"],
+                            result["duration"], 
+                            result.get("thumb_path")
+                        )
                     
-                    # Save to cache with file_id
-                    await save_cached_song(
-                        query, 
-                        result["title"], 
-                        result["performer"], 
-                        result["duration"],
-                        sent.audio.file_id, 
-                        sent.audio.thumbs[0].file_id if sent.audio.thumbs else None,
-                        sent.id
-                    )
+                        # Save to cache with file_id
+                        await save_cached_song(
+                            query, 
+                            result["title"], 
+                            result["performer"], 
+                            result["duration"],
+                            sent.audio.file_id, 
+                            sent.audio.thumbs[0].file_id if sent.audio.thumbs else None,
+                            sent.id
+                        )
                     
-                    await msg.edit("✅ Done! Sending...")
-                    await m.reply_audio(sent.audio.file_id)
-                    print(f"[CACHED] Saved to storage: {query}")
+                        await msg.edit("✅ Done! Sending...")
+                        await m.reply_audio(sent.audio.file_id)
+                        print(f"[CACHED] Saved to storage: {query}")
                     
-                except Exception as e:
-                    # Storage upload failed, send directly without caching
-                    print(f"[STORAGE ERROR] Failed to upload: {e}")
-                    await msg.edit("⚠️ Storage unavailable, sending directly...")
+                    except Exception as e:
+                        # Storage upload failed, send directly without caching
+                        print(f"[STORAGE ERROR] Failed to upload: {e}")
+                        await msg.edit("⚠️ Storage unavailable, sending directly...")
+                        await m.reply_audio(
+                            result["file"], 
+                            title=result["title"], 
+                            performer=result["performer"],
+                            duration=result["duration"], 
+                            thumb=await thumb_task
+                        )
+                else:
+                    # No storage configured, send directly (no caching)
+                    await msg.edit("✅ Sending...")
+                    result["thumb_path"] = await thumb_task
                     await m.reply_audio(
                         result["file"], 
                         title=result["title"], 
@@ -740,17 +881,11 @@ async def song_handler(_, m: Message):
                         duration=result["duration"], 
                         thumb=result.get("thumb_path")
                     )
-            else:
-                # No storage configured, send directly (no caching)
-                await msg.edit("✅ Sending...")
-                await m.reply_audio(
-                    result["file"], 
-                    title=result["title"], 
-                    performer=result["performer"],
-                    duration=result["duration"], 
-                    thumb=result.get("thumb_path")
-                )
-                print(f"[NO STORAGE] Sent directly without caching")
+                    print(f"[NO STORAGE] Sent directly without caching")
+            finally:
+                # An early failure must not leave the fetch running unowned
+                if not thumb_task.done():
+                    thumb_task.cancel()
             
             await msg.delete()
             try:
@@ -759,7 +894,7 @@ async def song_handler(_, m: Message):
                 pass
             
             # Cleanup temporary files
-            shutil.rmtree(result["tmpdir"], ignore_errors=True)
+            schedule_cleanup(result["tmpdir"])
             
     except asyncio.TimeoutError:
         await msg.edit("❌ Download timed out. Try again later.")
@@ -819,7 +954,8 @@ async def video_handler(_, m: Message):
     msg = await m.reply_text(f"🎬 Downloading video...\n`{query}`")
 
     try:
-        async with GLOBAL_SEM:
+        # FFMPEG_SEM first, so queued video jobs don't hold download slots
+        async with FFMPEG_SEM, GLOBAL_SEM:
             result = await download_video(query)
 
         await msg.edit("📤 Uploading video...")
@@ -848,7 +984,7 @@ async def video_handler(_, m: Message):
         except:
             pass
 
-        shutil.rmtree(result["tmpdir"], ignore_errors=True)
+        schedule_cleanup(result["tmpdir"])
 
     except asyncio.TimeoutError:
         await msg.edit("❌ Download timed out.")
@@ -936,6 +1072,7 @@ async def purge_handler(_, m: Message):
     try:
         query = m.text.split(None, 1)[1].strip().lower()
         deleted_count = await purge_music_cache(query)
+        _QUERY_CACHE.clear()
         await m.reply_text(f"🗑️ Deleted {deleted_count} entries matching `{query}`")
     except Exception as e:
         await m.reply_text(f"❌ Error: {str(e)}")
@@ -1047,6 +1184,8 @@ async def cleanup():
             if client:
                 client.close()
         
+        close_ydl_pool()
+        
         # Close any other resources if needed
         if 'arq' in globals() and arq is not None:
             if hasattr(arq, 'close'):
@@ -5,8 +5,9 @@ Provides async database operations for William Butcher Bot using SQLite.
 import json
 import sqlite3
 import asyncio
+import time
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from functools import wraps
 
 DB_PATH = Path("wbb.sqlite")
@@ -15,6 +16,11 @@ def get_db():
     """Get SQLite database connection."""
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
+    # WAL (set once in init_tables) is crash-safe with NORMAL: no fsync per commit
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    # Read pages straight from the OS page cache instead of copying them in
+    conn.execute("PRAGMA mmap_size=268435456")
     return conn
 
 def async_db(func):
@@ -25,10 +31,59 @@ def async_db(func):
         return await loop.run_in_executor(None, lambda: func(*args, **kwargs))
     return wrapper
 
+# Keyed lookups only, so the primary key is the table (no rowid + autoindex copy)
+MEDIA_HASHES_TABLE = """
+    CREATE TABLE IF NOT EXISTS media_hashes (
+        chat_id INTEGER,
+        file_hash TEXT,
+        user_id INTEGER,
+        message_id INTEGER,
+        timestamp INTEGER,
+        PRIMARY KEY (chat_id, file_hash)
+    ) WITHOUT ROWID
+"""
+
+# Clustered on (chat_id, user_id); secondary indexes then carry user_id,
+# so the user_id-only kick scans never touch the table
+MEDIA_STATS_TABLE = """
+    CREATE TABLE IF NOT EXISTS media_stats (
+        chat_id INTEGER,
+        user_id INTEGER,
+        photos INTEGER DEFAULT 0,
+        videos INTEGER DEFAULT 0,
+        total INTEGER DEFAULT 0,
+        last_media INTEGER,
+        PRIMARY KEY (chat_id, user_id)
+    ) WITHOUT ROWID
+"""
+
+# Looked up by exact query only, so the row lives in the query B-tree itself
+MUSIC_CACHE_TABLE = """
+    CREATE TABLE IF NOT EXISTS music_cache (
+        query TEXT PRIMARY KEY,
+        title TEXT,
+        performer TEXT,
+        duration INTEGER,
+        file_id TEXT,
+        thumb_file_id TEXT,
+        storage_msg_id INTEGER,
+        created_at INTEGER,
+        last_accessed INTEGER,
+        access_count INTEGER DEFAULT 0
+    ) WITHOUT ROWID
+"""
+MUSIC_CACHE_COLUMNS = (
+    "query", "title", "performer", "duration", "file_id", "thumb_file_id",
+    "storage_msg_id", "created_at", "last_accessed", "access_count",
+)
+
 def init_tables():
     """Initialize all required tables."""
     conn = get_db()
     
+    # Persistent per database file, so every module's connections get it
+    conn.execute("PRAGMA journal_mode=WAL")
+    
     # Blocklist table
     conn.execute("""
         CREATE TABLE IF NOT EXISTS blocklist (
@@ -170,6 +225,14 @@ def init_tables():
         )
     """)
     
+    # Karma history table (recent changes per chat, newest first)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS karma_history (
+            chat_id INTEGER PRIMARY KEY,
+            history TEXT
+        )
+    """)
+    
     # Media deduplication settings table
     conn.execute("""
         CREATE TABLE IF NOT EXISTS media_dedupe_settings (
@@ -179,29 +242,22 @@ def init_tables():
     """)
     
     # Media hashes table
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS media_hashes (
-            chat_id INTEGER,
-            file_hash TEXT,
-            user_id INTEGER,
-            message_id INTEGER,
-            timestamp INTEGER,
-            PRIMARY KEY (chat_id, file_hash)
-        )
-    """)
+    conn.execute(MEDIA_HASHES_TABLE)
+    migrate_without_rowid(conn, "media_hashes", MEDIA_HASHES_TABLE)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_media_hashes_time ON media_hashes (timestamp)"
+    )
     
-    # Media stats table
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS media_stats (
-            chat_id INTEGER,
-            user_id INTEGER,
-            photos INTEGER DEFAULT 0,
-            videos INTEGER DEFAULT 0,
-            total INTEGER DEFAULT 0,
-            last_media INTEGER,
-            PRIMARY KEY (chat_id, user_id)
-        )
-    """)
+    # Media stats table (rebuilt before indexing; a rebuild drops old indexes)
+    conn.execute(MEDIA_STATS_TABLE)
+    migrate_without_rowid(conn, "media_stats", MEDIA_STATS_TABLE)
+    # Leaderboard / low-media scans and inactivity scans per chat
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_media_stats_total ON media_stats (chat_id, total)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_media_stats_last ON media_stats (chat_id, last_media)"
+    )
     
     # Region blocks table
     conn.execute("""
@@ -260,21 +316,8 @@ def init_tables():
     """)
     
     # Music cache table
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS music_cache (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            query TEXT UNIQUE,
-            title TEXT,
-            performer TEXT,
-            duration INTEGER,
-            file_id TEXT,
-            thumb_file_id TEXT,
-            storage_msg_id INTEGER,
-            created_at INTEGER,
-            last_accessed INTEGER,
-            access_count INTEGER DEFAULT 0
-        )
-    """)
+    conn.execute(MUSIC_CACHE_TABLE)
+    migrate_without_rowid(conn, "music_cache", MUSIC_CACHE_TABLE, MUSIC_CACHE_COLUMNS)
     
     # Warnings table
     conn.execute("""
@@ -315,9 +358,46 @@ def init_tables():
         )
     """)
 
+    migrate_karma_history(conn)
+
     conn.commit()
     conn.close()
 
+def migrate_karma_history(conn):
+    """Move legacy karma_history_<chat_id> rows out of the karma table."""
+    rows = conn.execute(
+        "SELECT chat_id, karma_data FROM karma WHERE name LIKE 'karma!_history!_%' ESCAPE '!'"
+    ).fetchall()
+    for chat_id, karma_data in rows:
+        history = json.loads(karma_data).get("history", []) if karma_data else []
+        conn.execute(
+            "INSERT OR IGNORE INTO karma_history (chat_id, history) VALUES (?, ?)",
+            (chat_id, json.dumps(history))
+        )
+    if rows:
+        conn.execute("DELETE FROM karma WHERE name LIKE 'karma!_history!_%' ESCAPE '!'")
+
+def migrate_without_rowid(
+    conn, table: str, create_sql: str, columns: Tuple[str, ...] = ()
+):
+    """Rebuild a legacy rowid table from create_sql (WITHOUT ROWID), keeping its rows.
+
+    Pass columns when the new table drops some of the old ones (e.g. a
+    surrogate id); otherwise every column is copied as-is.
+    """
+    row = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (table,)
+    ).fetchone()
+    if not row or "WITHOUT ROWID" in row[0].upper():
+        return
+    conn.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+    conn.execute(create_sql)
+    cols = ", ".join(columns) or "*"
+    target = f"{table} ({cols})" if columns else table
+    conn.execute(f"INSERT OR IGNORE INTO {target} SELECT {cols} FROM {table}_old")
+    conn.execute(f"DROP TABLE {table}_old")
+
 # Initialize tables on import
 init_tables()
 
@@ -848,36 +928,6 @@ async def save_media_hash(chat_id: int, file_hash: str, user_id: int, message_id
     )
 
 
-async def increment_user_media(chat_id: int, user_id: int, media_type: str):
-    """Increment user's media count."""
-    # First try to update existing record
-    if media_type == "photo":
-        result = await async_db(
-            "UPDATE user_media_stats SET photos = photos + 1, total = total + 1, last_media = ? WHERE chat_id = ? AND user_id = ?",
-            (int(time.time()), chat_id, user_id)
-        )
-    elif media_type == "video":
-        result = await async_db(
-            "UPDATE user_media_stats SET videos = videos + 1, total = total + 1, last_media = ? WHERE chat_id = ? AND user_id = ?",
-            (int(time.time()), chat_id, user_id)
-        )
-    
-    # If no rows were updated, insert new record
-    if result == 0:
-        if media_type == "photo":
-            await async_db(
-                """INSERT INTO user_media_stats (chat_id, user_id, photos, videos, total, last_media) 
-                   VALUES (?, ?, 1, 0, 1, ?)""",
-                (chat_id, user_id, int(time.time()))
-            )
-        elif media_type == "video":
-            await async_db(
-                """INSERT INTO user_media_stats (chat_id, user_id, photos, videos, total, last_media) 
-                   VALUES (?, ?, 0, 1, 1, ?)""",
-                (chat_id, user_id, int(time.time()))
-            )
-
-
 async def get_user_media_stats(chat_id: int, user_id: int) -> dict:
     """Get user's media statistics."""
     result = await async_db(
@@ -1863,6 +1913,85 @@ def update_karma(chat_id: int, name: str, karma_data: dict):
     conn.close()
 
 
+@async_db
+def inc_karma(chat_id: int, name: str, delta: int) -> int:
+    """Atomically add delta to a user's karma in a chat and return the new value."""
+    conn = get_db()
+    try:
+        # Take the write lock up front so concurrent voters can't lose updates
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.execute(
+            "SELECT karma_data FROM karma WHERE chat_id = ? AND name = ?",
+            (chat_id, name)
+        )
+        row = cursor.fetchone()
+        karma_data = json.loads(row[0]) if row and row[0] else {}
+        karma_data["karma"] = karma_data.get("karma", 0) + delta
+        
+        conn.execute(
+            "INSERT OR REPLACE INTO karma (chat_id, name, karma_data) VALUES (?, ?, ?)",
+            (chat_id, name, json.dumps(karma_data))
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    
+    return karma_data["karma"]
+
+
+@async_db
+def push_karma_history(chat_id: int, entries: list, limit: int = 50):
+    """Prepend entries (newest first) to a chat's karma history, keeping the last `limit`."""
+    conn = get_db()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        history = entries[:limit]
+        # A full batch replaces the stored list outright, no need to decode it
+        if len(history) < limit:
+            cursor = conn.execute(
+                "SELECT history FROM karma_history WHERE chat_id = ?",
+                (chat_id,)
+            )
+            row = cursor.fetchone()
+            if row and row[0]:
+                history.extend(json.loads(row[0])[:limit - len(history)])
+        
+        conn.execute(
+            "INSERT OR REPLACE INTO karma_history (chat_id, history) VALUES (?, ?)",
+            (chat_id, json.dumps(history, separators=(",", ":")))
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@async_db
+def karma_chat_aggregate(chat_id: int) -> dict:
+    """Get karma count/sum/min/max and positive/negative user counts for a chat."""
+    conn = get_db()
+    cursor = conn.execute(
+        """SELECT COUNT(*), SUM(k), SUM(k > 0), SUM(k < 0), MAX(k), MIN(k)
+           FROM (
+               SELECT json_extract(karma_data, '$.karma') AS k
+               FROM karma
+               WHERE chat_id = ? AND json_valid(karma_data)
+           )
+           WHERE k IS NOT NULL""",
+        (chat_id,)
+    )
+    row = cursor.fetchone()
+    conn.close()
+    
+    return {
+        "total_users": row[0] or 0,
+        "total_karma": row[1] or 0,
+        "positive": row[2] or 0,
+        "negative": row[3] or 0,
+        "max": row[4],
+        "min": row[5]
+    }
+
+
 @async_db
 def is_karma_on(chat_id: int) -> bool:
     """Check if karma system is enabled for a chat."""
@@ -1914,6 +2043,16 @@ def is_dedupe_enabled(chat_id: int) -> bool:
     return bool(row and row[0])
 
 
+@async_db
+def get_dedupe_enabled_chats() -> list:
+    """Get the IDs of all chats with deduplication enabled."""
+    conn = get_db()
+    cursor = conn.execute("SELECT chat_id FROM media_dedupe_settings WHERE enabled = 1")
+    chat_ids = [row[0] for row in cursor]
+    conn.close()
+    return chat_ids
+
+
 @async_db
 def set_dedupe_enabled(chat_id: int, enabled: bool):
     """Enable/disable deduplication for a chat."""
@@ -1943,6 +2082,33 @@ def check_duplicate_media(chat_id: int, file_hash: str) -> Optional[dict]:
     return None
 
 
+@async_db
+def get_media_hashes(chat_id: int) -> list:
+    """Get every stored media hash for a chat."""
+    conn = get_db()
+    cursor = conn.execute(
+        "SELECT file_hash FROM media_hashes WHERE chat_id = ?",
+        (chat_id,)
+    )
+    results = cursor.fetchall()
+    conn.close()
+    
+    return [row[0] for row in results]
+
+
+@async_db
+def prune_media_hashes(max_age: int) -> int:
+    """Delete media hashes older than max_age seconds; returns rows removed."""
+    conn = get_db()
+    cursor = conn.execute(
+        "DELETE FROM media_hashes WHERE timestamp < ?",
+        (int(time.time()) - max_age,)
+    )
+    conn.commit()
+    conn.close()
+    return cursor.rowcount
+
+
 @async_db
 def save_media_hash(chat_id: int, file_hash: str, user_id: int, message_id: int):
     """Save media hash to prevent duplicates."""
@@ -1956,25 +2122,31 @@ def save_media_hash(chat_id: int, file_hash: str, user_id: int, message_id: int)
 
 
 @async_db
-def increment_user_media(chat_id: int, user_id: int, media_type: str):
-    """Increment user's media count."""
-    column = "photos" if media_type == "photo" else "videos"
-    conn = get_db()
+def save_media_batch(hashes: list, counts: list):
+    """Write buffered media hashes and per-user count deltas in one transaction.
     
-    conn.execute(
-        f"""INSERT OR REPLACE INTO media_stats (chat_id, user_id, photos, videos, total, last_media) 
-            VALUES (
-                ?,
-                ?,
-                COALESCE((SELECT photos FROM media_stats WHERE chat_id = ? AND user_id = ?), 0) + CASE WHEN ? = 'photos' THEN 1 ELSE 0 END,
-                COALESCE((SELECT videos FROM media_stats WHERE chat_id = ? AND user_id = ?), 0) + CASE WHEN ? = 'videos' THEN 1 ELSE 0 END,
-                COALESCE((SELECT total FROM media_stats WHERE chat_id = ? AND user_id = ?), 0) + 1,
-                ?
-            )""",
-        (chat_id, user_id, chat_id, user_id, column, chat_id, user_id, column, chat_id, user_id, int(time.time()))
-    )
-    conn.commit()
-    conn.close()
+    hashes: (chat_id, file_hash, user_id, message_id, timestamp) rows
+    counts: (chat_id, user_id, photos, videos, last_media) deltas
+    """
+    conn = get_db()
+    try:
+        conn.executemany(
+            "INSERT OR IGNORE INTO media_hashes (chat_id, file_hash, user_id, message_id, timestamp) VALUES (?, ?, ?, ?, ?)",
+            hashes
+        )
+        conn.executemany(
+            """INSERT INTO media_stats (chat_id, user_id, photos, videos, total, last_media)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT(chat_id, user_id) DO UPDATE SET
+                   photos = photos + excluded.photos,
+                   videos = videos + excluded.videos,
+                   total = total + excluded.total,
+                   last_media = excluded.last_media""",
+            [(c, u, p, v, p + v, last) for c, u, p, v, last in counts]
+        )
+        conn.commit()
+    finally:
+        conn.close()
 
 
 @async_db
@@ -2029,10 +2201,11 @@ def get_inactive_media_users(chat_id: int, inactive_seconds: int) -> list:
         "SELECT user_id FROM media_stats WHERE chat_id = ? AND (last_media IS NULL OR last_media < ?)",
         (chat_id, cutoff_time)
     )
-    results = cursor.fetchall()
+    # Read IDs straight off the cursor, no intermediate list of Rows
+    user_ids = [row[0] for row in cursor]
     conn.close()
     
-    return [row[0] for row in results]
+    return user_ids
 
 
 @async_db
@@ -2043,40 +2216,29 @@ def get_low_media_users(chat_id: int, threshold: int) -> list:
         "SELECT user_id FROM media_stats WHERE chat_id = ? AND total < ?",
         (chat_id, threshold)
     )
-    results = cursor.fetchall()
+    # Read IDs straight off the cursor, no intermediate list of Rows
+    user_ids = [row[0] for row in cursor]
     conn.close()
     
-    return [row[0] for row in results]
+    return user_ids
 
 
 @async_db
 def get_chat_media_stats(chat_id: int) -> dict:
     """Get overall media statistics for a chat."""
     conn = get_db()
-    
-    # Total photos
-    cursor = conn.execute("SELECT SUM(photos) FROM media_stats WHERE chat_id = ?", (chat_id,))
-    total_photos = cursor.fetchone()[0] or 0
-    
-    # Total videos
-    cursor = conn.execute("SELECT SUM(videos) FROM media_stats WHERE chat_id = ?", (chat_id,))
-    total_videos = cursor.fetchone()[0] or 0
-    
-    # Total media
-    cursor = conn.execute("SELECT SUM(total) FROM media_stats WHERE chat_id = ?", (chat_id,))
-    total_media = cursor.fetchone()[0] or 0
-    
-    # Active users
-    cursor = conn.execute("SELECT COUNT(*) FROM media_stats WHERE chat_id = ? AND total > 0", (chat_id,))
-    active_users = cursor.fetchone()[0] or 0
-    
+    cursor = conn.execute(
+        "SELECT SUM(photos), SUM(videos), SUM(total), SUM(total > 0) FROM media_stats WHERE chat_id = ?",
+        (chat_id,)
+    )
+    row = cursor.fetchone()
     conn.close()
     
     return {
-        "total_photos": total_photos,
-        "total_videos": total_videos,
-        "total_media": total_media,
-        "active_users": active_users
+        "total_photos": row[0] or 0,
+        "total_videos": row[1] or 0,
+        "total_media": row[2] or 0,
+        "active_users": row[3] or 0
     }
 
 
@@ -2181,24 +2343,13 @@ def get_cached_song(query: str, exact_only: bool = True) -> Optional[dict]:
     if row:
         # Update access tracking
         conn.execute(
-            "UPDATE music_cache SET last_accessed = ?, access_count = access_count + 1 WHERE id = ?",
-            (int(time.time()), row[0])
+            "UPDATE music_cache SET last_accessed = ?, access_count = access_count + 1 WHERE query = ?",
+            (int(time.time()), row["query"])
         )
         conn.commit()
         conn.close()
         
-        return {
-            "query": row[1],
-            "title": row[2],
-            "performer": row[3],
-            "duration": row[4],
-            "file_id": row[5],
-            "thumb_file_id": row[6],
-            "storage_msg_id": row[7],
-            "created_at": row[8],
-            "last_accessed": row[9],
-            "access_count": row[10]
-        }
+        return dict(row)
     
     if exact_only:
         conn.close()
@@ -2213,27 +2364,16 @@ def get_cached_song(query: str, exact_only: bool = True) -> Optional[dict]:
     
     # Simple fuzzy matching - return first reasonable match
     for row in results:
-        if row[1] and query_norm in row[1].lower():
+        if row["query"] and query_norm in row["query"].lower():
             # Update access tracking
             conn.execute(
-                "UPDATE music_cache SET last_accessed = ?, access_count = access_count + 1 WHERE id = ?",
-                (int(time.time()), row[0])
+                "UPDATE music_cache SET last_accessed = ?, access_count = access_count + 1 WHERE query = ?",
+                (int(time.time()), row["query"])
             )
             conn.commit()
             conn.close()
             
-            return {
-                "query": row[1],
-                "title": row[2],
-                "performer": row[3],
-                "duration": row[4],
-                "file_id": row[5],
-                "thumb_file_id": row[6],
-                "storage_msg_id": row[7],
-                "created_at": row[8],
-                "last_accessed": row[9],
-                "access_count": row[10]
-            }
+            return dict(row)
     
     conn.close()
     return None
@@ -2290,21 +2430,7 @@ def get_recent_cached_songs(limit: int = 15) -> list:
     results = cursor.fetchall()
     conn.close()
     
-    return [
-        {
-            "query": row[1],
-            "title": row[2],
-            "performer": row[3],
-            "duration": row[4],
-            "file_id": row[5],
-            "thumb_file_id": row[6],
-            "storage_msg_id": row[7],
-            "created_at": row[8],
-            "last_accessed": row[9],
-            "access_count": row[10]
-        }
-        for row in results
-    ]
+    return [dict(row) for row in results]
 
 
 @async_db